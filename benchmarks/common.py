@@ -0,0 +1,160 @@
+"""Setup and output shared by the benchmarks and the tests.
+
+Import it before the app: it fills in the settings that the app reads from the
+environment at import time, with values that don't matter for the benchmarks.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import uuid
+from datetime import date, timedelta
+from os import environ, path
+
+from cryptography.fernet import Fernet
+
+environ.setdefault("SECRET_KEY", "benchmark")
+environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+environ.setdefault("PRIVATE_KEY", "")
+environ.setdefault("PUBLIC_KEY", "")
+
+from flask import Flask  # noqa: E402
+
+from myleagues_api.db import db, init_db  # noqa: E402
+from myleagues_api.models.league import League  # noqa: E402
+from myleagues_api.models.match import Match  # noqa: E402
+from myleagues_api.models.user import User  # noqa: E402
+from myleagues_api.tables.participations import participations  # noqa: E402
+
+CONFIG_FILE = path.join(
+    path.dirname(path.dirname(path.abspath(__file__))),
+    "myleagues_api",
+    "configs",
+    "sqlite.py",
+)
+MAX_SCORE = 10
+
+
+def create_sqlite_app():
+    """Create a minimal app on the SQLite config, without creating the tables."""
+
+    app = Flask(__name__)
+    app.config.from_pyfile(CONFIG_FILE)
+    init_db(app, db)
+
+    return app
+
+
+def create_league(
+    nr_of_players, nr_of_matches, ranking_system="regular", seed=0, player_ids=None
+):
+    """Create a league with random players and matches and return its id.
+
+    New players are created, unless the ids of existing ones are given. The
+    matches are the same for the same seed and players.
+    """
+
+    rng = random.Random(seed)
+
+    league_id = uuid.uuid4()
+
+    if player_ids is None:
+        player_ids = [uuid.uuid4() for _ in range(nr_of_players)]
+        db.session.bulk_insert_mappings(
+            User,
+            [
+                {"id": player_id, "username": f"{league_id.hex[:8]}-{idx}"}
+                for idx, player_id in enumerate(player_ids)
+            ],
+        )
+
+    db.session.bulk_insert_mappings(
+        League,
+        [
+            {
+                "id": league_id,
+                "name": f"synthetic-{nr_of_players}-{nr_of_matches}",
+                "ranking_system": ranking_system,
+                "join_code": league_id.hex[:4].upper(),
+                "created_at": time.time(),
+            }
+        ],
+    )
+    db.session.execute(
+        participations.insert(),
+        [{"league_id": league_id, "user_id": player_id} for player_id in player_ids],
+    )
+
+    matches = []
+    for idx in range(nr_of_matches):
+        home_player_id, away_player_id = rng.sample(player_ids, 2)
+        matches.append(
+            {
+                "id": uuid.uuid4(),
+                "league_id": league_id,
+                "date": date(2020, 1, 1) + timedelta(days=idx // 10),
+                "home_player_id": home_player_id,
+                "home_score": rng.randint(0, MAX_SCORE),
+                "away_player_id": away_player_id,
+                "away_score": rng.randint(0, MAX_SCORE),
+                "created_by": home_player_id,
+                "created_at": idx,
+            }
+        )
+    db.session.bulk_insert_mappings(Match, matches)
+    db.session.commit()
+
+    return league_id
+
+
+def get_metadata(**versions):
+    """Get metadata to identify the environment and version of a run.
+
+    The keyword arguments are added, e.g. the versions of the libraries under test.
+    """
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=path.dirname(path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **versions,
+    }
+
+
+def create_parser(doc):
+    """Create the argument parser of a benchmark, with the '--output' argument."""
+
+    parser = argparse.ArgumentParser(description=doc.splitlines()[0])
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    return parser
+
+
+def main(run, parse_args):
+    """Run a benchmark with its command line arguments.
+
+    'run' gets the parsed arguments and returns the results, which are written as
+    JSON to the '--output' file if one is given.
+    """
+
+    args = parse_args()
+    output = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
@@ -0,0 +1,80 @@
+"""Benchmark the password checks of concurrent logins.
+
+Simulates bursts of concurrent logins, each checking a password, once without a
+limit and once with at most 'HASH_MAX_CONCURRENT' checks at a time. The results
+are written as JSON, so runs can be compared. Run it from the root of the
+repository, e.g.
+
+    python -m benchmarks.login_benchmark --concurrency 1 8 32 --output results.json
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from benchmarks.common import create_parser, get_metadata, main
+from myleagues_api.models import user
+
+PASSWORD = "benchmark"
+
+
+def measure(check, password_hashed, nr_of_logins, concurrency):
+    """Measure the number of password checks per second of concurrent logins."""
+
+    with ThreadPoolExecutor(max_workers=concurrency) as logins:
+
+        start = time.perf_counter()
+        results = list(
+            logins.map(lambda _: check(password_hashed, PASSWORD), range(nr_of_logins))
+        )
+        duration = time.perf_counter() - start
+
+    assert all(results)
+
+    return {"seconds": duration, "logins_per_second": nr_of_logins / duration}
+
+
+def run(args):
+    """Run the benchmark for all concurrency levels."""
+
+    password_hashed = generate_password_hash(PASSWORD, args.hash_method)
+    results = []
+
+    for concurrency in args.concurrency:
+        for mode, check in [
+            ("unbounded", check_password_hash),
+            ("bounded", user.check_password),
+        ]:
+            result = {
+                "mode": mode,
+                "concurrency": concurrency,
+                **measure(check, password_hashed, args.logins, concurrency),
+            }
+            results.append(result)
+
+            print(
+                f"{mode:>9} {concurrency:>4} concurrent: "
+                f"{result['logins_per_second']:8.1f} logins/s"
+            )
+
+    metadata = get_metadata(
+        hash_method=args.hash_method, hash_max_concurrent=user.HASH_MAX_CONCURRENT
+    )
+
+    return {"metadata": metadata, "results": results}
+
+
+def parse_args():
+    """Parse the command line arguments."""
+
+    parser = create_parser(__doc__)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--hash-method", default=user.HASH_METHOD)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(run, parse_args)
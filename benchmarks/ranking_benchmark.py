@@ -0,0 +1,144 @@
+"""Benchmark the ranking systems on synthetic leagues.
+
+Builds leagues of the requested sizes in the SQLite database, times
+'get_ranking' and 'get_ranking_history' for every registered ranking system and
+records the peak memory. The results are written as JSON, so runs of different
+versions can be compared. Run it from the root of the repository, e.g.
+
+    python -m benchmarks.ranking_benchmark --players 10 100 --matches 100 1000 \
+        --output results.json
+"""
+
+import statistics
+import time
+import tracemalloc
+
+import numpy
+import sqlalchemy
+
+from benchmarks.common import (
+    create_league,
+    create_parser,
+    create_sqlite_app,
+    get_metadata,
+    main,
+)
+from myleagues_api.db import db
+from myleagues_api.models.league import League, ranking_system_factory
+
+
+def run_operation(ranking_system, league_id, operation):
+    """Run an operation of a ranking system, starting from an empty session.
+
+    Loading the league and its matches is part of the operation.
+    """
+
+    db.session.expunge_all()
+
+    league = League.query.get(league_id)
+    getattr(
+        ranking_system_factory.get_ranking_system(ranking_system, league=league),
+        operation,
+    )()
+
+
+def measure(ranking_system, league_id, operation, repeat):
+    """Time an operation of a ranking system and record its peak memory.
+
+    Memory is traced in a separate run, because tracing slows down the timed runs.
+    """
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_operation(ranking_system, league_id, operation)
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run_operation(ranking_system, league_id, operation)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "min_seconds": min(durations),
+        "median_seconds": statistics.median(durations),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run(args):
+    """Run the benchmark for all combinations of league sizes."""
+
+    app = create_sqlite_app()
+    results = []
+
+    with app.app_context():
+        db.create_all()
+
+        for ranking_system in args.ranking_systems:
+            for nr_of_players in args.players:
+                for nr_of_matches in args.matches:
+
+                    league_id = create_league(
+                        nr_of_players, nr_of_matches, ranking_system, args.seed
+                    )
+
+                    # The history ranks every date again, so its cost grows with
+                    # both the players and the matches
+                    operations = ["get_ranking"]
+                    if nr_of_players * nr_of_matches <= args.history_max_size:
+                        operations.append("get_ranking_history")
+
+                    for operation in operations:
+                        result = {
+                            "ranking_system": ranking_system,
+                            "players": nr_of_players,
+                            "matches": nr_of_matches,
+                            "operation": operation,
+                            **measure(
+                                ranking_system, league_id, operation, args.repeat
+                            ),
+                        }
+                        results.append(result)
+
+                        print(
+                            f"{ranking_system:>16} {nr_of_players:>6} players "
+                            f"{nr_of_matches:>7} matches {operation:>19}: "
+                            f"{result['median_seconds']:9.4f} s "
+                            f"{result['peak_memory_bytes'] / 2 ** 20:9.1f} MiB"
+                        )
+
+    metadata = get_metadata(numpy=numpy.__version__, sqlalchemy=sqlalchemy.__version__)
+
+    return {"metadata": metadata, "results": results}
+
+
+def parse_args():
+    """Parse the command line arguments."""
+
+    parser = create_parser(__doc__)
+    parser.add_argument(
+        "--ranking-systems",
+        nargs="+",
+        default=sorted(ranking_system_factory._ranking_systems),
+        choices=sorted(ranking_system_factory._ranking_systems),
+    )
+    parser.add_argument("--players", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument(
+        "--matches", nargs="+", type=int, default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument(
+        "--history-max-size",
+        type=int,
+        default=100000,
+        help="Skip the ranking history for leagues with more players times matches "
+        "than this.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(run, parse_args)
@@ -0,0 +1,131 @@
+"""Benchmark signing and verifying access tokens per algorithm.
+
+Generates a key for every supported algorithm and measures how many access tokens
+per second the key ring signs and verifies with it. The results are written as
+JSON, so runs can be compared. Run it from the root of the repository, e.g.
+
+    python -m benchmarks.token_benchmark --output results.json
+"""
+
+import statistics
+import time
+
+import cryptography
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from benchmarks.common import create_parser, get_metadata, main
+from myleagues_api.models.key_ring import SUPPORTED_ALGORITHMS, Key, KeyRing
+
+PAYLOAD = {
+    "iss": "myleagues-api",
+    "exp": time.time() + 86400,
+    "user_id": "00000000-0000-0000-0000-000000000000",
+    "username": "benchmark",
+    "picture": None,
+    "locale": "en",
+}
+
+
+def generate_private_key(algorithm):
+    """Generate a private key for an algorithm."""
+
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+
+    raise ValueError(algorithm)
+
+
+def create_key_ring(algorithm):
+    """Create a key ring with a new PEM key pair for an algorithm."""
+
+    private_key = generate_private_key(algorithm)
+
+    key = Key(
+        kid=algorithm,
+        algorithm=algorithm,
+        private_key=private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode(),
+        public_key=private_key.public_key()
+        .public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode(),
+    )
+
+    return KeyRing([key], signing_kid=algorithm)
+
+
+def measure(operation, nr_of_operations, repeat):
+    """Measure the number of operations per second of a function."""
+
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(nr_of_operations):
+            operation()
+        rates.append(nr_of_operations / (time.perf_counter() - start))
+
+    return {"max_per_second": max(rates), "median_per_second": statistics.median(rates)}
+
+
+def run(args):
+    """Run the benchmark for all algorithms."""
+
+    results = []
+
+    for algorithm in args.algorithms:
+
+        key_ring = create_key_ring(algorithm)
+        token = key_ring.encode(PAYLOAD)
+
+        for operation_name, operation in [
+            ("sign", lambda: key_ring.encode(PAYLOAD)),
+            ("verify", lambda: key_ring.decode(token, issuer=PAYLOAD["iss"])),
+        ]:
+            result = {
+                "algorithm": algorithm,
+                "operation": operation_name,
+                **measure(operation, args.operations, args.repeat),
+            }
+            results.append(result)
+
+            print(
+                f"{algorithm:>6} {operation_name:>6}: "
+                f"{result['median_per_second']:10.0f} tokens/s"
+            )
+
+    metadata = get_metadata(
+        pyjwt=jwt.__version__, cryptography=cryptography.__version__
+    )
+
+    return {"metadata": metadata, "results": results}
+
+
+def parse_args():
+    """Parse the command line arguments."""
+
+    parser = create_parser(__doc__)
+    parser.add_argument(
+        "--algorithms",
+        nargs="+",
+        default=SUPPORTED_ALGORITHMS,
+        choices=SUPPORTED_ALGORITHMS,
+    )
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(run, parse_args)
@@ -12,7 +12,8 @@ from myleagues_api.endpoints.league import blueprint_league
 from myleagues_api.endpoints.match import blueprint_match
 from myleagues_api.endpoints.saml import blueprint_saml
 from myleagues_api.endpoints.user import blueprint_user
-from myleagues_api.models.access_token import AccessToken
+from myleagues_api.models.access_token import AccessToken, AccessTokenWriter
+from myleagues_api.schema import create_schema, schema_is_current, set_search_path
 
 OPEN_ENDPOINTS = [
     "user.login",
@@ -114,13 +115,23 @@ def create_app(config_file, db) -> Flask:
         # Initialize the database
         init_db(app, db)
 
-        # Create the schema and make it the default schema
-        db.engine.execute(f"CREATE SCHEMA IF NOT EXISTS {environ['POSTGRES_SCHEMA']}")
-        db.engine.execute(f"SET search_path = {environ['POSTGRES_SCHEMA']}")
+        # Make the schema the default schema of every connection
+        set_search_path(app, db, environ["POSTGRES_SCHEMA"])
 
-        # Create database, schema and tables
-        db.create_all()
-        db.session.commit()
+        # Only create the schema and tables when the stored version is outdated
+        if not schema_is_current(db):
+
+            if not app.config.get("CREATE_SCHEMA_ON_STARTUP", True):
+                raise RuntimeError(
+                    "The database schema is outdated, "
+                    "run 'python -m myleagues_api.schema' first."
+                )
+
+            create_schema(db, environ["POSTGRES_SCHEMA"])
+
+        # Store access token records in the background, if enabled
+        if app.config.get("ACCESS_TOKEN_WRITE_ASYNC", False):
+            app.extensions["access_token_writer"] = AccessTokenWriter(app)
 
         # Add before_request and errorhandler functions
         add_before_request(app)
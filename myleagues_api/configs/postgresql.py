@@ -12,11 +12,29 @@ SQLALCHEMY_DATABASE_URI = (
     f"@{environ['POSTGRES_HOSTNAME']}/{environ['POSTGRES_DATABASE']}"
 )
 
+# Optional read replica, used for the reads of GET endpoints
+if "POSTGRES_REPLICA_HOSTNAME" in environ:
+    SQLALCHEMY_BINDS = {
+        "replica": (
+            f"postgresql+psycopg2"
+            f"://{environ['POSTGRES_USERNAME']}:{environ['POSTGRES_PASSWORD']}"
+            f"@{environ['POSTGRES_REPLICA_HOSTNAME']}/{environ['POSTGRES_DATABASE']}"
+        )
+    }
+
 SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
 SQLALCHEMY_POOL_SIZE = 10
 SQLALCHEMY_POOL_RECYCLE = 3600
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Set to 'false' to refuse to start, rather than create the schema, when it is
+# outdated. The schema is then created with 'python -m myleagues_api.schema'.
+CREATE_SCHEMA_ON_STARTUP = environ.get("CREATE_SCHEMA_ON_STARTUP", "true") == "true"
+
+# Set to 'true' to store access token records in the background, so logins don't
+# wait on the insert
+ACCESS_TOKEN_WRITE_ASYNC = environ.get("ACCESS_TOKEN_WRITE_ASYNC", "false") == "true"
+
 # Flask configurations
 SECRET_KEY = environ["SECRET_KEY"]
 TESTING = False
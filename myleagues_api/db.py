@@ -1,8 +1,73 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from functools import wraps
+
+from flask import Flask, g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import SelectBase
+
+# Bind key of the optional read replica (see configs/postgresql.py)
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the reads of replica-enabled views to the read replica.
+
+    Only SELECT statements are routed; flushes, updates, inserts and deletes always
+    go to the primary. Without a configured replica this is a regular session.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        """Return the replica engine for reads of replica-enabled views."""
+
+        if (
+            has_app_context()
+            and g.get("read_from_replica")
+            and REPLICA_BIND in (self.app.config.get("SQLALCHEMY_BINDS") or {})
+            and isinstance(clause, SelectBase)
+            and not self._flushing
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+
+        return super().get_bind(mapper=mapper, clause=clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy object that creates routing sessions."""
+
+    def create_session(self, options):
+        """Create the session factory for routing sessions."""
+
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
 
 # This db instance can be be imported by anything (models, blueprint, the main app)
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+
+def read_from_replica(view):
+    """Let the reads of a view use the read replica, if one is configured.
+
+    Only use this for views that do not need to read their own writes: the replica
+    may lag behind the primary.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_from_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.read_from_replica = False
+
+    return wrapper
+
+
+@compiles(UUID, "sqlite")
+def compile_uuid_for_sqlite(type_, compiler, **kwargs):
+    """Store UUID columns as text on SQLite (see configs/sqlite.py)."""
+    return "CHAR(36)"
 
 
 def init_db(app=None, db=None):
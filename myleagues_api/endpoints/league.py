@@ -1,13 +1,30 @@
 """League endpoints."""
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+
 from flask import Blueprint, abort, g, jsonify, request
 from flask_cors import CORS
 
+from myleagues_api.db import read_from_replica
+from myleagues_api.endpoints.serialization import (
+    get_eager_relationships,
+    get_requested_attributes,
+    is_requested,
+    serialize_league,
+    serialize_leagues,
+)
 from myleagues_api.models.league import League
+from myleagues_api.models.ranking_systems.ranking import HISTORY_STEPS
 from myleagues_api.models.user import User
 
 blueprint_league = Blueprint("league", __name__)
 CORS(blueprint_league)
 
+# Page sizes for the matches of a league
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 
 @blueprint_league.route("/league", methods=["POST"])
 def create():
@@ -23,27 +40,20 @@ def create():
 
     User().add_to_league(user_id=g.user_id, league_id=league.id)
 
+    attributes = get_requested_attributes()
+    league = League.read_one(
+        {"id": league.id}, eager=get_eager_relationships(attributes)
+    )
+
     return (
-        jsonify(
-            {
-                "data": {
-                    "type": "leagues",
-                    "id": str(league.id),
-                    "attributes": {
-                        **league.as_dict(),
-                        "ranking": league.get_ranking(),
-                        "players": league.get_players(),
-                        "matches": league.get_matches(),
-                    },
-                }
-            }
-        ),
+        jsonify({"data": serialize_league(league, attributes)}),
         200,
     )
 
 
 @blueprint_league.route("/league/", defaults={"id": None})
 @blueprint_league.route("/league/<id>", methods=["GET"])
+@read_from_replica
 def read(id):
     """Create endpoint for 'get league' functionality."""
 
@@ -54,42 +64,58 @@ def read(id):
     if len(filter.keys()) == 0:
         abort(400, "Invalid request. Pass at least one identifier.")
 
+    # The matches are paginated when a page size or cursor is passed
+    page_size = request.args.get("page[size]")
+    page_cursor = request.args.get("page[cursor]")
+    paginate = page_size is not None or page_cursor is not None
+
+    try:
+        page_size = DEFAULT_PAGE_SIZE if page_size is None else int(page_size)
+    except ValueError:
+        page_size = 0
+
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        abort(400, f"Invalid page size. Use an integer from 1 to {MAX_PAGE_SIZE}.")
+
+    links = {"self": request.url}
+    attributes = get_requested_attributes()
+    eager = get_eager_relationships(attributes)
+
     if "id" in filter or "join_code" in filter:
-        league = League.read_one(filter)
-        data = {
-            "type": "leagues",
-            "id": str(league.id),
-            "attributes": {
-                **league.as_dict(),
-                "ranking": league.get_ranking(),
-                "players": league.get_players(),
-                "matches": league.get_matches()[::-1],
-            },
-        }
+
+        # A page of matches is read separately
+        if paginate:
+            eager = [
+                relationship for relationship in eager if relationship != "matches"
+            ]
+
+        league = League.read_one(filter, eager=eager)
+
+        matches = None
+        if is_requested(attributes, "matches"):
+            if paginate:
+                matches, next_cursor = league.get_matches_page(page_size, page_cursor)
+                if next_cursor is not None:
+                    links["next"] = (
+                        f"{request.base_url}?"
+                        f"{urlencode({**request.args, 'page[cursor]': next_cursor})}"
+                    )
+            else:
+                matches = league.get_matches()[::-1]
+
+        data = serialize_league(league, attributes, matches=matches)
     else:
-        leagues = League.read_many(filter)
-        data = []
-        for league in leagues:
-            data.append(
-                {
-                    "type": "leagues",
-                    "id": str(league.id),
-                    "attributes": {
-                        **league.as_dict(),
-                        "ranking": league.get_ranking(),
-                        "players": league.get_players(),
-                        "matches": league.get_matches(),
-                    },
-                }
-            )
+        leagues = League.read_many(filter, eager=eager)
+        data = serialize_leagues(leagues, attributes)
 
     return (
-        jsonify({"data": data, "links": {"self": request.url}}),
+        jsonify({"data": data, "links": links}),
         200,
     )
 
 
 @blueprint_league.route("/league/<id>/ranking_history", methods=["GET"])
+@read_from_replica
 def get_ranking_history(id):
     """Create endpoint for 'get ranking history' functionality."""
 
@@ -97,6 +123,39 @@ def get_ranking_history(id):
 
     league = League.read_one(filter)
 
+    # Parse the (optional) window, step and player subset
+    date_from = request.args.get("filter[date_from]")
+    date_to = request.args.get("filter[date_to]")
+    step = request.args.get("step")
+    player_ids = request.args.get("filter[player_ids]")
+
+    try:
+        if date_from is not None:
+            date_from = datetime.strptime(date_from, "%Y-%m-%d").date()
+        if date_to is not None:
+            date_to = datetime.strptime(date_to, "%Y-%m-%d").date()
+    except ValueError:
+        abort(400, "Invalid date. Use the format YYYY-MM-DD.")
+
+    if step is not None and step not in HISTORY_STEPS:
+        try:
+            step = int(step)
+        except ValueError:
+            step = 0
+
+        if step < 1:
+            abort(400, "Invalid step. Use a positive integer, 'day' or 'week'.")
+
+    if player_ids is not None:
+        try:
+            player_ids = {uuid.UUID(player_id) for player_id in player_ids.split(",")}
+        except ValueError:
+            abort(400, "Invalid player id.")
+
+    ranking_history = league.get_ranking_history(
+        date_from=date_from, date_to=date_to, step=step, player_ids=player_ids
+    )
+
     return (
         jsonify(
             {
@@ -105,7 +164,7 @@ def get_ranking_history(id):
                     "id": str(league.id),
                     "attributes": {
                         **league.as_dict(),
-                        "ranking_history": league.get_ranking_history(),
+                        "ranking_history": ranking_history,
                     },
                 }
             }
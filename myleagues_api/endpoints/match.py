@@ -2,14 +2,18 @@
 from datetime import datetime
 from time import time
 
-from flask import Blueprint, g, jsonify, request
+from flask import Blueprint, abort, g, jsonify, request
 from flask_cors import CORS
 
+from myleagues_api.models.league import League
 from myleagues_api.models.match import Match
 
 blueprint_match = Blueprint("match", __name__)
 CORS(blueprint_match)
 
+# Maximum number of matches in one batch
+MAX_BATCH_SIZE = 10000
+
 
 @blueprint_match.route("/match", methods=["POST"])
 def post():
@@ -48,3 +52,29 @@ def post():
         ),
         200,
     )
+
+
+@blueprint_match.route("/match/batch", methods=["POST"])
+def post_batch():
+    """Create endpoint for the 'create matches in bulk' action."""
+
+    data = request.json
+
+    if not isinstance(data.get("matches"), list):
+        abort(400, "Invalid request. Pass a list of matches.")
+
+    if len(data["matches"]) > MAX_BATCH_SIZE:
+        abort(400, f"Too many matches. Pass at most {MAX_BATCH_SIZE} per batch.")
+
+    league = League.read_one({"id": data["league_id"]}, eager=["players"])
+
+    # Store the matches
+    results = Match.create_many(
+        league_id=league.id,
+        player_ids={player.id for player in league.players},
+        matches=data["matches"],
+        created_by=g.user_id,
+        created_at=int(time()),
+    )
+
+    return jsonify({"data": results}), 200
@@ -0,0 +1,111 @@
+"""Serialization of leagues for the endpoints."""
+
+from flask import abort, request
+
+from myleagues_api.models.league import SERIALIZED_RELATIONSHIPS, League
+
+# Attributes of a league that are expensive to compute; only included on request
+EXPENSIVE_ATTRIBUTES = ["ranking", *SERIALIZED_RELATIONSHIPS]
+
+
+def get_requested_attributes():
+    """Get the league attributes requested with 'fields[leagues]' and 'include'.
+
+    Follows the JSON:API sparse fieldsets: 'fields[leagues]' lists the attributes
+    to return and 'include' the expensive attributes (ranking, players, matches)
+    to compute. Returns None if all attributes are requested.
+    """
+
+    fields = request.args.get("fields[leagues]")
+    include = request.args.get("include")
+
+    if fields is None and include is None:
+        return None
+
+    if fields is not None:
+        attributes = set(fields.split(","))
+    else:
+        attributes = {col.name for col in League.__table__.columns}
+        attributes.update(EXPENSIVE_ATTRIBUTES)
+
+    if include is not None:
+        included = set(include.split(",")) if include else set()
+        if not included.issubset(EXPENSIVE_ATTRIBUTES):
+            abort(400, f"Invalid include. Choose from {EXPENSIVE_ATTRIBUTES}.")
+
+        attributes -= set(EXPENSIVE_ATTRIBUTES) - included
+
+    return attributes
+
+
+def is_requested(attributes, attribute):
+    """Check whether an attribute is requested."""
+    return attributes is None or attribute in attributes
+
+
+def get_eager_relationships(attributes):
+    """Get the relationships to load eagerly for the requested attributes."""
+
+    return [
+        relationship
+        for relationship in SERIALIZED_RELATIONSHIPS
+        if is_requested(attributes, relationship)
+    ]
+
+
+def serialize_league(league, attributes=None, matches=None, ranking=True):
+    """Serialize a league with the requested attributes.
+
+    Parameters
+    ----------
+    league : League
+        The league.
+    attributes : Optional[Set[str]]
+        The requested attributes, see 'get_requested_attributes'.
+    matches : Optional[List[dict]]
+        The matches to return, if they are not all matches of the league.
+    ranking : bool
+        Whether to add the ranking (if requested). It is added last, because
+        computing it may commit the session, which expires the league.
+
+    Returns
+    -------
+    dict
+        The league as JSON:API resource object.
+
+    """
+
+    serialized = league.as_dict()
+
+    if is_requested(attributes, "players"):
+        serialized["players"] = league.get_players()
+
+    if is_requested(attributes, "matches"):
+        serialized["matches"] = matches if matches is not None else league.get_matches()
+
+    if ranking and is_requested(attributes, "ranking"):
+        serialized["ranking"] = league.get_ranking()
+
+    if attributes is not None:
+        serialized = {
+            key: value for key, value in serialized.items() if key in attributes
+        }
+
+    return {"type": "leagues", "id": str(league.id), "attributes": serialized}
+
+
+def serialize_leagues(leagues, attributes=None):
+    """Serialize several leagues, computing their rankings at once."""
+
+    data = [serialize_league(league, attributes, ranking=False) for league in leagues]
+
+    if is_requested(attributes, "ranking"):
+
+        # Storing the rankings commits the session, which expires the leagues
+        league_ids = [league.id for league in leagues]
+        rankings = League.get_rankings(leagues)
+
+        for league_id, league_data in zip(league_ids, data):
+            league_data["attributes"]["ranking"] = rankings[league_id]
+
+    return data
@@ -4,6 +4,13 @@ from flask import Blueprint, abort, g, jsonify, request
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 
+from myleagues_api.db import read_from_replica
+from myleagues_api.endpoints.serialization import (
+    get_eager_relationships,
+    get_requested_attributes,
+    serialize_league,
+    serialize_leagues,
+)
 from myleagues_api.models.access_token import AccessToken
 from myleagues_api.models.league import League
 from myleagues_api.models.user import User
@@ -55,46 +62,28 @@ def join_league():
 
     User().add_to_league(user_id=g.user_id, league_id=data["league_id"])
 
-    league = League.read_one({"id": data["league_id"]})
+    attributes = get_requested_attributes()
+    league = League.read_one(
+        {"id": data["league_id"]}, eager=get_eager_relationships(attributes)
+    )
 
     return (
-        jsonify(
-            {
-                "data": {
-                    "type": "leagues",
-                    "id": str(league.id),
-                    "attributes": {
-                        **league.as_dict(),
-                        "ranking": league.get_ranking(),
-                        "players": league.get_players(),
-                        "matches": league.get_matches(),
-                    },
-                }
-            }
-        ),
+        jsonify({"data": serialize_league(league, attributes)}),
         200,
     )
 
 
 @blueprint_user.route("/user/leagues", methods=["GET"])
+@read_from_replica
 def user_leagues():
     """Create endpoint for the 'get leagues for user' action."""
 
-    user = User.read({"id": g.user_id})
-
-    data = []
-    for league in user.leagues:
-        data.append(
-            {
-                "type": "leagues",
-                "id": str(league.id),
-                "attributes": {
-                    **league.as_dict(),
-                    "ranking": league.get_ranking(),
-                    "players": league.get_players(),
-                    "matches": league.get_matches(),
-                },
-            }
-        )
+    # Load all leagues of the user, their players and matches in a few queries
+    attributes = get_requested_attributes()
+    leagues = League.read_many(
+        {"player_id": g.user_id}, eager=get_eager_relationships(attributes)
+    )
+
+    data = serialize_leagues(leagues, attributes)
 
     return jsonify({"data": data}), 200
@@ -0,0 +1,24 @@
+"""Report how full the join code space is.
+
+Creating a league fails once no join code is free, so keep an eye on it:
+
+    python -m myleagues_api.join_codes
+"""
+
+import json
+
+from myleagues_api.models.league import League
+from myleagues_api.schema import create_command_app
+
+
+def main(config_file="configs/postgresql.py"):
+    """Print the join code usage of the database in the given configuration."""
+
+    app = create_command_app(config_file)
+
+    with app.app_context():
+        print(json.dumps(League.get_join_code_usage()))
+
+
+if __name__ == "__main__":
+    main()
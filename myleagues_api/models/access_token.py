@@ -1,21 +1,173 @@
+import hashlib
 import uuid
-from os import environ
+from collections import OrderedDict
+from queue import Empty, Queue
+from threading import Lock, Thread
 from time import time
 from typing import Any
 
 import jwt
-from flask import abort
+from flask import abort, current_app
 from sqlalchemy.dialects.postgresql import UUID
 
 from myleagues_api.db import db
+from myleagues_api.models.key_ring import KeyRing
 from myleagues_api.models.user import User
 
 ISSUER = "myleagues-api"
-ALGORITHM = "RS256"
 LIFE_SPAN = 86400  # 24 hours
 
-PRIVATE_KEY = environ["PRIVATE_KEY"]
-PUBLIC_KEY = environ["PUBLIC_KEY"]
+_key_ring = None
+
+# Maximum number of verified tokens kept in memory per process
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+
+# Number of expired access tokens deleted per transaction by the purge
+PURGE_BATCH_SIZE = 1000
+
+# Maximum number of access token records the writer inserts per transaction
+WRITER_BATCH_SIZE = 100
+
+
+class VerifiedTokenCache:
+    """Bounded in-process cache of verified access tokens.
+
+    Tokens are keyed by their SHA-256 digest, so the tokens themselves are not kept
+    in memory. An entry expires at the 'exp' of its token; when the cache is full
+    the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size=VERIFIED_TOKEN_CACHE_SIZE):
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, access_token):
+        """Get the contents of a verified token, or None if it is not cached."""
+
+        key = self.get_key(access_token)
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+            if entry is None or entry["exp"] <= time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return dict(entry)
+
+    def set(self, access_token, contents):
+        """Cache the contents of a verified token until it expires."""
+
+        key = self.get_key(access_token)
+
+        with self._lock:
+
+            self._entries[key] = dict(contents)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """Get the hit and miss counters and the number of cached tokens."""
+
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    @staticmethod
+    def get_key(access_token):
+        """Get the cache key of a token."""
+
+        return hashlib.sha256(access_token.encode()).digest()
+
+
+verified_token_cache = VerifiedTokenCache()
+
+
+class AccessTokenWriter:
+    """Background writer of access token records.
+
+    Logins hand their access token record to the writer instead of inserting it
+    themselves, so the response does not wait on the insert. A daemon thread
+    inserts the queued records in batches. Records still queued when the process
+    stops are lost, which only affects the bookkeeping: the tokens stay valid.
+    """
+
+    def __init__(self, app, batch_size=WRITER_BATCH_SIZE):
+
+        self.app = app
+        self.batch_size = batch_size
+
+        self._queue: Queue = Queue()
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        """Queue an access token record for insertion."""
+
+        self._queue.put(record)
+
+    def run(self):
+        """Insert the queued records in batches, forever."""
+
+        while True:
+
+            records = [self._queue.get()]
+            try:
+                while len(records) < self.batch_size:
+                    records.append(self._queue.get_nowait())
+            except Empty:
+                pass
+
+            self.write(records)
+
+            for _ in records:
+                self._queue.task_done()
+
+    def write(self, records):
+        """Insert records in one transaction."""
+
+        with self.app.app_context():
+
+            try:
+                db.session.execute(AccessToken.__table__.insert(), records)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Storing access tokens failed.")
+            finally:
+                db.session.remove()
+
+    def join(self):
+        """Wait until all queued records are written."""
+
+        self._queue.join()
+
+
+def get_key_ring():
+    """Get the key ring for access tokens, created from the environment once."""
+
+    global _key_ring
+    if _key_ring is None:
+        _key_ring = KeyRing.from_environ()
+
+    return _key_ring
 
 
 class AccessToken(db.Model):
@@ -28,11 +180,15 @@ class AccessToken(db.Model):
         UUID(as_uuid=True), db.ForeignKey("users.id"), index=True, unique=False
     )
     access_token = db.Column(db.Text)
-    created_at = db.Column(db.BigInteger, index=False)
+    created_at = db.Column(db.BigInteger, index=True)
 
     @classmethod
     def generate_and_store(cls, user: User) -> str:
-        """Generate and store an access token."""
+        """Generate and store an access token.
+
+        If the app has an access token writer, the record is stored in the
+        background; otherwise it is inserted before returning.
+        """
 
         payload = {
             "iss": ISSUER,
@@ -43,21 +199,77 @@ class AccessToken(db.Model):
             "locale": user.locale,
         }
 
-        access_token_string = jwt.encode(payload, PRIVATE_KEY, algorithm=ALGORITHM)
-        access_token_object = cls(
-            user_id=user.id, access_token=access_token_string, created_at=time()
-        )
+        access_token_string = get_key_ring().encode(payload)
+        record = {
+            "id": uuid.uuid4(),
+            "user_id": user.id,
+            "access_token": access_token_string,
+            "created_at": time(),
+        }
 
-        db.session.add(access_token_object)
+        writer = current_app.extensions.get("access_token_writer")
+        if writer is not None:
+            writer.submit(record)
+        else:
+            db.session.add(cls(**record))
+            db.session.commit()
 
         return access_token_string
 
+    @classmethod
+    def purge_expired(cls, batch_size=PURGE_BATCH_SIZE, max_batches=None):
+        """Delete the records of expired access tokens.
+
+        The records are deleted in batches of at most 'batch_size' rows, each in
+        its own transaction, so the purge never holds many locks at once.
+
+        Parameters
+        ----------
+        batch_size : int
+            Maximum number of records deleted per transaction.
+        max_batches : Optional[int]
+            Stop after this many batches, e.g. to bound the duration of a run.
+
+        Returns
+        -------
+        int
+            The number of deleted records.
+
+        """
+
+        # Tokens expire 'LIFE_SPAN' seconds after they are created
+        expired_ids = (
+            db.session.query(cls.id)
+            .filter(cls.created_at < time() - LIFE_SPAN)
+            .limit(batch_size)
+        )
+
+        deleted = 0
+        nr_of_batches = 0
+        while max_batches is None or nr_of_batches < max_batches:
+
+            nr_of_deleted = cls.query.filter(
+                cls.id.in_(expired_ids.subquery().select())
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+            deleted += nr_of_deleted
+            nr_of_batches += 1
+
+            if nr_of_deleted < batch_size:
+                break
+
+        return deleted
+
     @staticmethod
     def verify_and_return_contents(
         access_token: str,
     ) -> Any:
         """Verify and returns the contents of an access token.
 
+        Tokens that were verified before are returned from the verified token cache
+        until they expire, without checking their signature again.
+
         Parameters
         ----------
         access_token : str
@@ -70,11 +282,15 @@ class AccessToken(db.Model):
 
         """
 
+        cached_token = verified_token_cache.get(access_token)
+        if cached_token is not None:
+            return cached_token
+
         try:
 
-            decoded_token = jwt.decode(
-                access_token.encode(), PUBLIC_KEY, issuer=ISSUER, algorithms=[ALGORITHM]
-            )
+            decoded_token = get_key_ring().decode(access_token.encode(), issuer=ISSUER)
+            verified_token_cache.set(access_token, decoded_token)
+
             return decoded_token
 
         except (
@@ -0,0 +1,110 @@
+"""Key ring for signing and verifying access tokens."""
+
+import json
+from collections import namedtuple
+from os import environ
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+SUPPORTED_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+# Key id of the key in PRIVATE_KEY and PUBLIC_KEY, also used for tokens that were
+# signed before tokens had a key id
+LEGACY_KID = "default"
+LEGACY_ALGORITHM = "RS256"
+
+Key = namedtuple("Key", ["kid", "algorithm", "private_key", "public_key"])
+
+
+class KeyRing:
+    """Key ring for signing and verifying access tokens.
+
+    Tokens are signed with the signing key and carry its id in the 'kid' header.
+    They are verified with the key that has that id, so keys can be rotated without
+    downtime: add the new key, make it the signing key and remove the old key once
+    the tokens signed with it have expired. Keys without a private key can only
+    verify tokens.
+    """
+
+    def __init__(self, keys, signing_kid):
+
+        self.keys = {}
+        for key in keys:
+
+            if key.algorithm not in SUPPORTED_ALGORITHMS:
+                raise ValueError(f"Unsupported algorithm '{key.algorithm}'.")
+
+            # Load the PEM keys once, rather than on every signature
+            algorithm = get_default_algorithms()[key.algorithm]
+            self.keys[key.kid] = key._replace(
+                private_key=algorithm.prepare_key(key.private_key)
+                if key.private_key
+                else None,
+                public_key=algorithm.prepare_key(key.public_key),
+            )
+
+        if self.keys.get(signing_kid) is None or not self.keys[signing_kid].private_key:
+            raise ValueError(f"No private key for signing key '{signing_kid}'.")
+
+        self.signing_kid = signing_kid
+
+    @classmethod
+    def from_environ(cls):
+        """Create the key ring from the environment.
+
+        ACCESS_TOKEN_KEYS holds a JSON list of keys, each with a 'kid', an
+        'algorithm', a 'public_key' and optionally a 'private_key' (PEM).
+        ACCESS_TOKEN_SIGNING_KID selects the signing key and defaults to the first
+        key. The RS256 key pair in PRIVATE_KEY and PUBLIC_KEY is added as the key
+        with id 'default'.
+        """
+
+        keys = [
+            Key(
+                kid=key["kid"],
+                algorithm=key["algorithm"],
+                private_key=key.get("private_key"),
+                public_key=key["public_key"],
+            )
+            for key in json.loads(environ.get("ACCESS_TOKEN_KEYS", "[]"))
+        ]
+
+        if environ.get("PUBLIC_KEY"):
+            keys.append(
+                Key(
+                    kid=LEGACY_KID,
+                    algorithm=LEGACY_ALGORITHM,
+                    private_key=environ.get("PRIVATE_KEY"),
+                    public_key=environ["PUBLIC_KEY"],
+                )
+            )
+
+        if not keys:
+            raise ValueError("No access token keys configured.")
+
+        return cls(keys, environ.get("ACCESS_TOKEN_SIGNING_KID", keys[0].kid))
+
+    def encode(self, payload):
+        """Sign a payload with the signing key."""
+
+        key = self.keys[self.signing_kid]
+
+        return jwt.encode(
+            payload, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid}
+        )
+
+    def decode(self, token, **kwargs):
+        """Verify a token with the key in its 'kid' header and return its payload.
+
+        Raises a jwt.exceptions.InvalidTokenError if the token is invalid or its
+        key is unknown.
+        """
+
+        kid = jwt.get_unverified_header(token).get("kid", LEGACY_KID)
+
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.exceptions.InvalidTokenError(f"Unknown key id '{kid}'.")
+
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm], **kwargs)
@@ -1,13 +1,26 @@
+import base64
+import binascii
+import json
+import multiprocessing
 import random
 import string
 import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 from time import time
 
 from flask import abort
+from sqlalchemy import exc, func, tuple_
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 
 from myleagues_api.db import db
+from myleagues_api.models.match import Match
+from myleagues_api.models.ranking_snapshot import RankingSnapshot
+from myleagues_api.models.ranking_systems.match_batch import MatchBatch
 from myleagues_api.models.ranking_systems.ranking import RankingSystemFactory
 from myleagues_api.models.ranking_systems.ranking_perron_frobenius import (
     PerronFrobeniusRankingSystem,
@@ -25,6 +38,62 @@ ranking_system_factory.register_ranking_system(
     "perron_frobenius", PerronFrobeniusRankingSystem
 )
 
+# Rankings of these systems are computed in a process pool when several leagues
+# need one, because their NumPy work holds the GIL in places
+PROCESS_POOL_RANKING_SYSTEMS = ["perron_frobenius"]
+PROCESS_POOL_MAX_WORKERS = 4
+
+_process_pool = None
+
+# Join codes are random strings of these characters; creating a league gives up
+# after this many taken codes in a row
+JOIN_CODE_CHARACTERS = string.ascii_uppercase + string.digits
+JOIN_CODE_LENGTH = 4
+JOIN_CODE_MAX_ATTEMPTS = 10
+
+# Relationships that are serialized with a league
+SERIALIZED_RELATIONSHIPS = ["players", "matches"]
+
+# Plain (picklable) stand-ins for a league and its players, for the ranking systems
+LeagueData = namedtuple("LeagueData", ["id", "players"])
+PlayerData = namedtuple("PlayerData", ["id", "username"])
+
+
+def get_process_pool():
+    """Get the process pool for computing rankings, creating it on first use.
+
+    The workers are spawned rather than forked, because forking a web worker that
+    already runs threads can deadlock the child.
+    """
+
+    global _process_pool
+
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _process_pool
+
+
+def reset_process_pool():
+    """Drop a broken process pool, so the next use creates a new one."""
+
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
+
+
+def compute_ranking(ranking_system, league, match_batch):
+    """Compute the ranking of a league from its loaded matches."""
+
+    return ranking_system_factory.get_ranking_system(
+        ranking_system, league=league, match_batch=match_batch
+    ).get_ranking()
+
 
 class League(db.Model):
     """League model."""
@@ -46,10 +115,13 @@ class League(db.Model):
         backref="league",
         lazy=True,
     )
+    # Only the live matches, but every match still has its league
     matches = db.relationship(
         "Match",
+        primaryjoin="and_(League.id == Match.league_id, "
+        "Match.deleted_at.is_(None), Match.rejected_at.is_(None))",
         order_by="asc(Match.date), asc(Match.created_at)",
-        backref="league",
+        backref=db.backref("league", primaryjoin="League.id == Match.league_id"),
         lazy=True,
     )
 
@@ -67,51 +139,250 @@ class League(db.Model):
             ranking_system=ranking_system,
             created_at=time(),
         )
-        league.set_join_code()
 
-        db.session.add(league)
+        # Let the unique constraint detect join codes that are taken, and retry
+        # with a new random one a limited number of times
+        for _ in range(JOIN_CODE_MAX_ATTEMPTS):
+            league.set_join_code()
+
+            try:
+                db.session.add(league)
+                db.session.flush()
+                break
+            except exc.IntegrityError as e:
+                db.session.rollback()
+
+                # Only retry if it was the join code that was taken
+                if not cls.query.filter_by(join_code=league.join_code).count():
+                    raise e
+        else:
+            abort(503, "No join code available. Please try again.")
+
+        # Start with an empty snapshot, so later match writes can invalidate it
+        db.session.add(
+            RankingSnapshot(
+                league_id=league.id, ranking_system=ranking_system, updated_at=time()
+            )
+        )
         db.session.commit()
         db.session.refresh(league)
 
         return league
 
     @classmethod
-    def read_one(cls, filter):
-        """Read one league from the database."""
+    def read_one(cls, filter, eager=()):
+        """Read one league from the database.
+
+        The relationships named in 'eager' ('players', 'matches') are loaded upfront.
+        """
+
+        query = cls.query.options(*cls.get_serialization_options(eager))
 
         try:
-            return cls.query.filter_by(**filter).one()
+            return query.filter_by(**filter).one()
         except NoResultFound:
             abort(404, "No league found.")
         except MultipleResultsFound:
             abort(409, "Multiple leagues found. Define stricter filters.")
 
     @classmethod
-    def read_many(cls, filter):
-        """Read many leagues from the database."""
+    def read_many(cls, filter, eager=()):
+        """Read many leagues from the database.
+
+        The relationships named in 'eager' ('players', 'matches') are loaded upfront.
+        """
+
+        query = cls.query.options(*cls.get_serialization_options(eager))
 
         if "player_id" in filter:
-            return cls.query.join(participations).filter(
-                participations.columns.user_id == filter["player_id"]
+            return (
+                query.join(participations)
+                .filter(participations.columns.user_id == filter["player_id"])
+                .all()
             )
 
-        return cls.query.filter_by(**filter).all()
+        return query.filter_by(**filter).all()
+
+    @classmethod
+    def get_serialization_options(cls, eager=SERIALIZED_RELATIONSHIPS):
+        """Get the query options to eagerly load what serializing a league needs.
+
+        The players and the matches (with their home and away players joined in)
+        are each loaded in one query for all leagues in the result, so the number
+        of queries doesn't grow with the number of leagues or matches.
+        """
+
+        options = []
+
+        if "players" in eager:
+            options.append(selectinload(cls.players))
+
+        if "matches" in eager:
+            options.append(selectinload(cls.matches).joinedload(Match.home_player))
+            options.append(selectinload(cls.matches).joinedload(Match.away_player))
+
+        return options
 
     def get_ranking(self):
-        """Get the current ranking for this league."""
+        """Get the current ranking for this league.
+
+        The ranking is served from the ranking snapshot if that is up to date.
+        Otherwise it is computed and stored as the new snapshot.
+        """
+
+        snapshot = RankingSnapshot.read(self.id, self.ranking_system)
+        if snapshot is not None and snapshot.ranking is not None:
+            return snapshot.ranking
+
+        version = snapshot.version if snapshot is not None else None
 
         ranking_system = ranking_system_factory.get_ranking_system(
             self.ranking_system, league=self
         )
-        return ranking_system.get_ranking()
+        ranking = ranking_system.get_ranking()
 
-    def get_ranking_history(self):
-        """Get the ranking history for this league."""
+        RankingSnapshot.store(self.id, self.ranking_system, ranking, version=version)
+
+        return ranking
+
+    @classmethod
+    def get_rankings(cls, leagues):
+        """Get the current rankings for several leagues at once.
+
+        Rankings are served from the ranking snapshots where possible. The players
+        and matches of the other leagues are loaded in bulk, after which their
+        rankings are computed; in a process pool for the systems in
+        PROCESS_POOL_RANKING_SYSTEMS.
+
+        Returns
+        -------
+        Dict[uuid.UUID, List[dict]]
+            The ranking of every league, by league id.
+
+        """
+
+        leagues = list(leagues)
+        snapshots = RankingSnapshot.read_many([league.id for league in leagues])
+
+        rankings = {}
+        outdated = []
+        for league in leagues:
+            snapshot = snapshots.get((league.id, league.ranking_system))
+            if snapshot is not None and snapshot.ranking is not None:
+                rankings[league.id] = snapshot.ranking
+            else:
+                outdated.append((league, snapshot))
+
+        if not outdated:
+            return rankings
+
+        # Load everything that is needed before the computations start
+        league_data = cls.read_league_data([league.id for league, _ in outdated])
+        match_batches = MatchBatch.load_many(
+            {
+                league_id: [player.id for player in data.players]
+                for league_id, data in league_data.items()
+            }
+        )
+
+        pooled = [
+            league
+            for league, _ in outdated
+            if league.ranking_system in PROCESS_POOL_RANKING_SYSTEMS
+        ]
+        futures = {}
+        if len(pooled) > 1:
+            try:
+                futures = {
+                    league.id: get_process_pool().submit(
+                        compute_ranking,
+                        league.ranking_system,
+                        league_data[league.id],
+                        match_batches[league.id],
+                    )
+                    for league in pooled
+                }
+            except BrokenProcessPool:
+                reset_process_pool()
+                futures = {}
+
+        new_snapshots = []
+        for league, snapshot in outdated:
+
+            ranking = None
+            if league.id in futures:
+                try:
+                    ranking = futures[league.id].result()
+                except BrokenProcessPool:
+                    # A worker died; compute the rest inline
+                    reset_process_pool()
+                    futures = {}
+
+            if ranking is None:
+                ranking = compute_ranking(
+                    league.ranking_system,
+                    league_data[league.id],
+                    match_batches[league.id],
+                )
+
+            rankings[league.id] = ranking
+            new_snapshots.append(
+                (
+                    league.id,
+                    league.ranking_system,
+                    ranking,
+                    snapshot.version if snapshot is not None else None,
+                )
+            )
+
+        RankingSnapshot.store_many(new_snapshots)
+
+        return rankings
+
+    @staticmethod
+    def read_league_data(league_ids):
+        """Read the players of several leagues in one query.
+
+        Returns
+        -------
+        Dict[uuid.UUID, LeagueData]
+            The league data of every league, by league id.
+
+        """
+
+        # Imported here, because the user model imports this module
+        from myleagues_api.models.user import User
+
+        players_per_league = {league_id: [] for league_id in league_ids}
+
+        rows = (
+            db.session.query(participations.columns.league_id, User.id, User.username)
+            .join(User, User.id == participations.columns.user_id)
+            .filter(participations.columns.league_id.in_(league_ids))
+            .order_by(User.id.asc())
+        )
+        for league_id, player_id, username in rows:
+            players_per_league[league_id].append(PlayerData(player_id, username))
+
+        return {
+            league_id: LeagueData(league_id, players)
+            for league_id, players in players_per_league.items()
+        }
+
+    def get_ranking_history(
+        self, date_from=None, date_to=None, step=None, player_ids=None
+    ):
+        """Get the ranking history for this league.
+
+        See 'BaseRankingSystem.get_ranking_history' for the parameters.
+        """
 
         ranking_system = ranking_system_factory.get_ranking_system(
             self.ranking_system, league=self
         )
-        return ranking_system.get_ranking_history()
+        return ranking_system.get_ranking_history(
+            date_from=date_from, date_to=date_to, step=step, player_ids=player_ids
+        )
 
     def get_players(self):
         """Get the players for this league."""
@@ -127,38 +398,112 @@ class League(db.Model):
 
         matches = []
         for match in self.matches:
-            matches.append(
-                {
-                    "id": match.id,
-                    "date": match.date,
-                    "home_player_username": match.home_player.username,
-                    "away_player_username": match.away_player.username,
-                    "home_score": match.home_score,
-                    "away_score": match.away_score,
-                }
-            )
+            matches.append(self.get_match_dict(match))
 
         return matches
 
+    def get_matches_page(self, page_size, cursor=None):
+        """Get a page of the matches for this league, newest first.
+
+        Pages are keyed by (date, created_at, id), so every page is a range scan
+        of the matches index instead of a full load of the matches.
+
+        Parameters
+        ----------
+        page_size : int
+            Maximum number of matches on the page.
+        cursor : Optional[str]
+            Cursor of the page, as returned for the previous page.
+
+        Returns
+        -------
+        Tuple[List[dict], Optional[str]]
+            The matches on the page and the cursor of the next page (None if this
+            is the last page).
+
+        """
+
+        key = tuple_(Match.date, Match.created_at, Match.id)
+
+        query = (
+            Match.query.options(
+                joinedload(Match.home_player), joinedload(Match.away_player)
+            )
+            .filter(Match.league_id == self.id, Match.is_live())
+            .order_by(Match.date.desc(), Match.created_at.desc(), Match.id.desc())
+        )
+        if cursor is not None:
+            query = query.filter(key < self.decode_match_cursor(cursor))
+
+        # Read one more match to find out whether there is a next page
+        matches = query.limit(page_size + 1).all()
+
+        next_cursor = None
+        if len(matches) > page_size:
+            matches = matches[:page_size]
+            next_cursor = self.encode_match_cursor(matches[-1])
+
+        return [self.get_match_dict(match) for match in matches], next_cursor
+
+    @staticmethod
+    def get_match_dict(match):
+        """Get a match as it is returned with a league."""
+
+        return {
+            "id": match.id,
+            "date": match.date,
+            "home_player_username": match.home_player.username,
+            "away_player_username": match.away_player.username,
+            "home_score": match.home_score,
+            "away_score": match.away_score,
+        }
+
+    @staticmethod
+    def encode_match_cursor(match):
+        """Encode the pagination key of a match as an opaque cursor."""
+
+        key = [match.date.isoformat(), match.created_at, str(match.id)]
+
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @staticmethod
+    def decode_match_cursor(cursor):
+        """Decode a cursor into the (date, created_at, id) pagination key."""
+
+        try:
+            date, created_at, match_id = json.loads(base64.urlsafe_b64decode(cursor))
+            if type(created_at) is not int or not isinstance(match_id, str):
+                raise ValueError(cursor)
+
+            return (
+                datetime.strptime(date, "%Y-%m-%d").date(),
+                created_at,
+                uuid.UUID(match_id),
+            )
+        except (binascii.Error, ValueError, TypeError):
+            abort(400, "Invalid cursor.")
+
     def set_join_code(self):
-        """Set the join code."""
+        """Set a random join code."""
 
-        self.join_code = self.get_unique_join_code()
+        self.join_code = self.get_random_join_code()
 
     def as_dict(self):
         """Return the league as dictionary."""
 
         return {col.name: getattr(self, col.name) for col in self.__table__.columns}
 
+    @staticmethod
+    def get_random_join_code(length=JOIN_CODE_LENGTH):
+        """Get a random join code; it may already be taken."""
+
+        return "".join(random.choices(JOIN_CODE_CHARACTERS, k=length))
+
     @classmethod
-    def get_unique_join_code(cls, length=4):
-        """Get a unique join code."""
+    def get_join_code_usage(cls):
+        """Get how full the join code space is."""
 
-        join_code = "".join(
-            random.choices(string.ascii_uppercase + string.digits, k=length)
-        )
+        used = db.session.query(func.count(cls.join_code)).scalar()
+        available = len(JOIN_CODE_CHARACTERS) ** JOIN_CODE_LENGTH
 
-        if not cls.query.filter_by(join_code=join_code).first():
-            return join_code
-        else:
-            return cls.get_unique_join_code()
+        return {"used": used, "available": available, "ratio": used / available}
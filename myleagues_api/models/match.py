@@ -1,10 +1,28 @@
 """Match model."""
 
+import csv
+import io
 import uuid
+from datetime import datetime
 
+from sqlalchemy import and_
 from sqlalchemy.dialects.postgresql import UUID
 
 from myleagues_api.db import db
+from myleagues_api.models.ranking_snapshot import RankingSnapshot
+
+# Columns written when importing matches in bulk
+BULK_COLUMNS = [
+    "id",
+    "league_id",
+    "date",
+    "home_player_id",
+    "home_score",
+    "away_player_id",
+    "away_score",
+    "created_by",
+    "created_at",
+]
 
 
 class Match(db.Model):
@@ -36,6 +54,20 @@ class Match(db.Model):
         "User", backref="match_away_player", foreign_keys=away_player_id, lazy=True
     )
 
+    # Matches are always read per league, ordered by date (with the id to break
+    # ties when paginating), and only when they are neither deleted nor rejected
+    __table_args__ = (
+        db.Index(
+            "ix_matches_live_league_id_date_created_at_id",
+            league_id,
+            date,
+            created_at,
+            id,
+            postgresql_where=and_(deleted_at.is_(None), rejected_at.is_(None)),
+            sqlite_where=and_(deleted_at.is_(None), rejected_at.is_(None)),
+        ),
+    )
+
     @classmethod
     def create(
         cls,
@@ -62,11 +94,131 @@ class Match(db.Model):
         )
 
         db.session.add(match)
+
+        # The new match changes the ranking of the league
+        RankingSnapshot.invalidate(league_id)
+
         db.session.commit()
         db.session.refresh(match)
 
         return match
 
+    @classmethod
+    def create_many(cls, league_id, player_ids, matches, created_by, created_at):
+        """Validate and create many matches for a league in one transaction.
+
+        Valid matches are inserted with a single multi-row insert (COPY on
+        Postgres), invalid ones are skipped. The ranking snapshot of the league is
+        invalidated once for the whole batch.
+
+        Parameters
+        ----------
+        league_id : uuid.UUID
+            Id of the league.
+        player_ids : Collection[uuid.UUID]
+            Ids of the players of the league.
+        matches : List[dict]
+            The matches, with the same fields as for a single match.
+        created_by : uuid.UUID
+            Id of the user that imports the matches.
+        created_at : int
+            Timestamp of the import.
+
+        Returns
+        -------
+        List[dict]
+            Per match: its index and either its id or why it is invalid.
+
+        """
+
+        results = []
+        rows = []
+        for index, match in enumerate(matches):
+
+            try:
+                row = cls.validate(match, player_ids)
+            except ValueError as e:
+                results.append({"index": index, "status": "invalid", "message": str(e)})
+                continue
+
+            row.update(
+                id=uuid.uuid4(),
+                league_id=league_id,
+                created_by=created_by,
+                created_at=created_at,
+            )
+            rows.append(row)
+            results.append({"index": index, "status": "created", "id": row["id"]})
+
+        if rows:
+            if db.session.get_bind().dialect.name == "postgresql":
+                cls.copy_rows(rows)
+            else:
+                db.session.execute(cls.__table__.insert().values(rows))
+
+            # The new matches change the ranking of the league
+            RankingSnapshot.invalidate(league_id)
+
+        db.session.commit()
+
+        return results
+
+    @staticmethod
+    def validate(match, player_ids):
+        """Validate a match for a league and return it with parsed fields.
+
+        Raises a ValueError that describes the first problem found.
+        """
+
+        try:
+            row = {
+                "date": datetime.strptime(match["date"], "%Y-%m-%d").date(),
+                "home_player_id": uuid.UUID(match["home_player_id"]),
+                "home_score": match["home_score"],
+                "away_player_id": uuid.UUID(match["away_player_id"]),
+                "away_score": match["away_score"],
+            }
+        except KeyError as e:
+            raise ValueError(f"Missing field {e}.")
+        except (TypeError, ValueError):
+            raise ValueError("Invalid date or player id.")
+
+        for player in ["home_player_id", "away_player_id"]:
+            if row[player] not in player_ids:
+                raise ValueError(f"Player '{row[player]}' is not in this league.")
+
+        if row["home_player_id"] == row["away_player_id"]:
+            raise ValueError("A player cannot play against themselves.")
+
+        for score in ["home_score", "away_score"]:
+            if type(row[score]) is not int or row[score] < 0:
+                raise ValueError(f"Invalid {score}. Use a non-negative integer.")
+
+        return row
+
+    @classmethod
+    def copy_rows(cls, rows):
+        """Insert rows into the matches table with COPY (Postgres only)."""
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in BULK_COLUMNS])
+        buffer.seek(0)
+
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {cls.__tablename__} ({', '.join(BULK_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    @classmethod
+    def is_live(cls):
+        """Get the filter for matches that are neither deleted nor rejected."""
+
+        return and_(cls.deleted_at.is_(None), cls.rejected_at.is_(None))
+
     def as_dict(self):
         """Return a match as dictionary."""
 
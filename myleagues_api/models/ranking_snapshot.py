@@ -0,0 +1,157 @@
+"""Ranking snapshot model."""
+
+import uuid
+from time import time
+
+from sqlalchemy import exc, literal, select
+from sqlalchemy.dialects.postgresql import UUID, insert
+
+from myleagues_api.db import db
+
+
+class RankingSnapshot(db.Model):
+    """Ranking snapshot model.
+
+    Stores the last computed ranking of a league. Writes that change the ranking
+    bump the version and clear the ranking; the next read recomputes it.
+    """
+
+    __tablename__ = "ranking_snapshots"
+
+    league_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("leagues.id"), primary_key=True
+    )
+    ranking_system = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    ranking = db.Column(db.JSON, nullable=True)
+    updated_at = db.Column(db.BigInteger, index=False)
+
+    @classmethod
+    def read(cls, league_id, ranking_system):
+        """Read the snapshot for a league, or None if there is none."""
+
+        return cls.query.filter_by(
+            league_id=league_id, ranking_system=ranking_system
+        ).first()
+
+    @classmethod
+    def read_many(cls, league_ids):
+        """Read the snapshots for several leagues, by league id and ranking system."""
+
+        snapshots = cls.query.filter(cls.league_id.in_(list(league_ids))).all()
+
+        return {
+            (snapshot.league_id, snapshot.ranking_system): snapshot
+            for snapshot in snapshots
+        }
+
+    @classmethod
+    def store(cls, league_id, ranking_system, ranking, version=None):
+        """Store a ranking as the snapshot for a league.
+
+        If 'version' is given, the snapshot is only updated when its version is
+        still the same, so a ranking computed before a concurrent match write never
+        overwrites the invalidation. Commits the session.
+        """
+
+        cls.store_many([(league_id, ranking_system, ranking, version)])
+
+    @classmethod
+    def store_many(cls, snapshots):
+        """Store the rankings of several leagues in one transaction.
+
+        Parameters
+        ----------
+        snapshots : Iterable[Tuple[uuid.UUID, str, List[dict], Optional[int]]]
+            The league id, ranking system, ranking and version of every snapshot,
+            see 'store'.
+
+        """
+
+        try:
+
+            for league_id, ranking_system, ranking, version in snapshots:
+
+                if version is None:
+                    db.session.add(
+                        cls(
+                            league_id=league_id,
+                            ranking_system=ranking_system,
+                            version=1,
+                            ranking=cls.to_json(ranking),
+                            updated_at=time(),
+                        )
+                    )
+                else:
+                    cls.query.filter_by(
+                        league_id=league_id,
+                        ranking_system=ranking_system,
+                        version=version,
+                    ).update(
+                        {"ranking": cls.to_json(ranking), "updated_at": time()},
+                        synchronize_session=False,
+                    )
+
+            db.session.commit()
+
+        except exc.IntegrityError:
+
+            # Another request stored a snapshot first
+            db.session.rollback()
+
+    @classmethod
+    def invalidate(cls, league_id):
+        """Invalidate the snapshots of a league. Does not commit the session.
+
+        Leagues without a snapshot (created before snapshots existed) get an empty
+        one with a bumped version, so a ranking computed before this write cannot
+        be stored afterwards as if it were current.
+        """
+
+        # An empty snapshot with version 2 for the ranking system of the league
+        leagues = db.Model.metadata.tables["leagues"]
+        empty_snapshot = select(
+            [
+                leagues.c.id,
+                leagues.c.ranking_system,
+                literal(2),
+                literal(time()),
+            ]
+        ).where(leagues.c.id == league_id)
+        columns = ["league_id", "ranking_system", "version", "updated_at"]
+
+        if db.session.get_bind().dialect.name == "postgresql":
+            db.session.execute(
+                insert(cls.__table__)
+                .from_select(columns, empty_snapshot)
+                .on_conflict_do_update(
+                    index_elements=["league_id", "ranking_system"],
+                    set_={
+                        "version": cls.__table__.c.version + 1,
+                        "ranking": None,
+                        "updated_at": time(),
+                    },
+                )
+            )
+            return
+
+        updated = cls.query.filter_by(league_id=league_id).update(
+            {"version": cls.version + 1, "ranking": None, "updated_at": time()},
+            synchronize_session=False,
+        )
+        if not updated:
+            db.session.execute(
+                cls.__table__.insert().from_select(columns, empty_snapshot)
+            )
+
+    @staticmethod
+    def to_json(ranking):
+        """Convert the UUIDs in a ranking to strings, so it can be stored as JSON."""
+
+        return [
+            {
+                key: str(value) if isinstance(value, uuid.UUID) else value
+                for key, value in row.items()
+            }
+            for row in ranking
+        ]
@@ -0,0 +1,181 @@
+"""Columnar match representation for the ranking systems."""
+
+from collections import namedtuple
+
+from numpy import array
+
+from myleagues_api.db import db
+from myleagues_api.models.match import Match
+
+MatchRow = namedtuple(
+    "MatchRow", ["home_player_id", "away_player_id", "home_score", "away_score", "date"]
+)
+
+
+class MatchBatch:
+    """Columnar representation of a list of matches.
+
+    The players are stored as indices into 'player_ids', the scores and dates as
+    NumPy arrays. Iterating over a batch yields 'MatchRow' tuples, which have the
+    same attributes as 'Match' for everything the ranking systems need.
+    """
+
+    def __init__(
+        self,
+        player_ids,
+        home_player_idx,
+        away_player_idx,
+        home_scores,
+        away_scores,
+        dates,
+    ):
+
+        self.player_ids = list(player_ids)
+
+        self.home_player_idx = home_player_idx
+        self.away_player_idx = away_player_idx
+        self.home_scores = home_scores
+        self.away_scores = away_scores
+        self.dates = dates
+
+    @classmethod
+    def from_rows(cls, player_ids, rows):
+        """Create a match batch from (home, away, home score, away score, date) rows.
+
+        Parameters
+        ----------
+        player_ids : List[uuid.UUID]
+            The ids of the players in the league; the player indices refer to these.
+        rows : Iterable[Tuple]
+            Rows of home player id, away player id, home score, away score and date.
+
+        Returns
+        -------
+        MatchBatch
+            The match batch.
+
+        """
+
+        player_indices = {player_id: idx for idx, player_id in enumerate(player_ids)}
+
+        home_player_idx, away_player_idx = [], []
+        home_scores, away_scores, dates = [], [], []
+        for home_player_id, away_player_id, home_score, away_score, date in rows:
+            home_player_idx.append(player_indices[home_player_id])
+            away_player_idx.append(player_indices[away_player_id])
+            home_scores.append(home_score)
+            away_scores.append(away_score)
+            dates.append(date)
+
+        return cls(
+            player_ids,
+            array(home_player_idx, int),
+            array(away_player_idx, int),
+            array(home_scores, int),
+            array(away_scores, int),
+            array(dates, "datetime64[D]"),
+        )
+
+    @classmethod
+    def from_matches(cls, player_ids, matches):
+        """Create a match batch from match objects."""
+
+        return cls.from_rows(
+            player_ids,
+            (
+                (
+                    match.home_player_id,
+                    match.away_player_id,
+                    match.home_score,
+                    match.away_score,
+                    match.date,
+                )
+                for match in matches
+            ),
+        )
+
+    @classmethod
+    def load(cls, league_id, player_ids):
+        """Load the matches of a league, selecting only the columns needed."""
+
+        rows = (
+            db.session.query(
+                Match.home_player_id,
+                Match.away_player_id,
+                Match.home_score,
+                Match.away_score,
+                Match.date,
+            )
+            .filter(Match.league_id == league_id, Match.is_live())
+            .order_by(Match.date.asc(), Match.created_at.asc())
+        )
+
+        return cls.from_rows(player_ids, rows)
+
+    @classmethod
+    def load_many(cls, player_ids_per_league):
+        """Load the matches of several leagues in one query.
+
+        Parameters
+        ----------
+        player_ids_per_league : Dict[uuid.UUID, List[uuid.UUID]]
+            The player ids of every league, by league id.
+
+        Returns
+        -------
+        Dict[uuid.UUID, MatchBatch]
+            The match batch of every league, by league id.
+
+        """
+
+        rows_per_league = {league_id: [] for league_id in player_ids_per_league}
+
+        rows = (
+            db.session.query(
+                Match.league_id,
+                Match.home_player_id,
+                Match.away_player_id,
+                Match.home_score,
+                Match.away_score,
+                Match.date,
+            )
+            .filter(Match.league_id.in_(list(player_ids_per_league)), Match.is_live())
+            .order_by(Match.date.asc(), Match.created_at.asc())
+        )
+        for league_id, *row in rows:
+            rows_per_league[league_id].append(row)
+
+        return {
+            league_id: cls.from_rows(player_ids_per_league[league_id], rows)
+            for league_id, rows in rows_per_league.items()
+        }
+
+    def __len__(self):
+        """Return the number of matches."""
+        return len(self.home_scores)
+
+    def __getitem__(self, key):
+        """Return a match row for an index, or a match batch for a slice."""
+
+        if isinstance(key, slice):
+            return MatchBatch(
+                self.player_ids,
+                self.home_player_idx[key],
+                self.away_player_idx[key],
+                self.home_scores[key],
+                self.away_scores[key],
+                self.dates[key],
+            )
+
+        return MatchRow(
+            self.player_ids[self.home_player_idx[key]],
+            self.player_ids[self.away_player_idx[key]],
+            int(self.home_scores[key]),
+            int(self.away_scores[key]),
+            self.dates[key].item(),
+        )
+
+    def __iter__(self):
+        """Iterate over the matches as match rows."""
+        for key in range(len(self)):
+            yield self[key]
@@ -1,15 +1,35 @@
 from abc import ABC, abstractmethod
 
+from numpy import append, datetime64, flatnonzero, ones
+
+from myleagues_api.models.ranking_systems.match_batch import MatchBatch
+
+# Steps for the ranking history other than 'every Nth match'
+HISTORY_STEP_DAY = "day"
+HISTORY_STEP_WEEK = "week"
+HISTORY_STEPS = [HISTORY_STEP_DAY, HISTORY_STEP_WEEK]
+
 
 class BaseRankingSystem(ABC):
     """Base class for the ranking systems."""
 
-    def __init__(self, league):
+    def __init__(self, league, match_batch=None):
 
         self.league = league
 
         self.players = self.league.players
-        self.all_matches = self.league.matches
+        self.player_ids = [player.id for player in self.players]
+
+        self._match_batch = match_batch
+
+    @property
+    def all_matches(self):
+        """Get all matches of the league as a match batch, loaded on first use."""
+
+        if self._match_batch is None:
+            self._match_batch = MatchBatch.load(self.league.id, self.player_ids)
+
+        return self._match_batch
 
     @abstractmethod
     def get_ranking(self):
@@ -42,37 +62,130 @@ class BaseRankingSystem(ABC):
 
         return initial_dictionary
 
-    def get_ranking_history(self):
-        """Get the ranking history."""
-
-        labels = ["start"]
-        datasets = {player.id: {"data": [0]} for player in self.players}
-
-        for i in range(1, len(self.all_matches) + 1):
-
-            matches = self.all_matches[:i]
-
-            labels.append(
-                f"{matches[-1].home_player.username} - "
-                f"{matches[-1].away_player.username} "
-                f"({matches[-1].home_score} - "
-                f"{matches[-1].away_score})"
-            )
-
-            ranking = self.get_ranking(matches)
+    def get_ranking_history(
+        self, date_from=None, date_to=None, step=None, player_ids=None
+    ):
+        """Get the ranking history.
+
+        Parameters
+        ----------
+        date_from : Optional[datetime.date]
+            Only include the rankings after matches on or after this date.
+        date_to : Optional[datetime.date]
+            Only include the rankings after matches on or before this date.
+        step : Optional[Union[int, str]]
+            Only include the ranking after every Nth match, or after the last match
+            of every 'day' or 'week'. The last ranking in the window is always
+            included.
+        player_ids : Optional[Collection[uuid.UUID]]
+            Only include the datasets of these players.
+
+        Returns
+        -------
+        Dict[str, list]
+            The labels and the datasets (one per player) of the ranking history.
+
+        """
+
+        players = [
+            player
+            for player in self.players
+            if player_ids is None or player.id in player_ids
+        ]
+        usernames = {player.id: player.username for player in self.players}
+
+        # Without a start date, the history starts before the first match
+        labels = ["start"] if date_from is None else []
+        datasets = {
+            player.id: {"data": [0] if date_from is None else []} for player in players
+        }
+
+        indices = self.get_history_indices(date_from, date_to, step)
+
+        for index, ranking in zip(indices, self.get_rankings_per_match(indices)):
+
+            match = self.all_matches[index]
+
+            if step == HISTORY_STEP_DAY:
+                labels.append(match.date.isoformat())
+            elif step == HISTORY_STEP_WEEK:
+                year, week, _ = match.date.isocalendar()
+                labels.append(f"{year}-W{week:02}")
+            else:
+                labels.append(
+                    f"{usernames[match.home_player_id]} - "
+                    f"{usernames[match.away_player_id]} "
+                    f"({match.home_score} - "
+                    f"{match.away_score})"
+                )
 
             for row in ranking:
                 player_id = row["player_id"]
+                if player_id not in datasets:
+                    continue
+
                 datasets[player_id]["data"].append(row["pts_primary"])
                 datasets[player_id][
                     "label"
                 ] = f"{row['position']}. {row['username']} ({row['pts_primary']})"
                 datasets[player_id]["position"] = row["position"]
 
-        datasets = sorted(list(datasets.values()), key=lambda k: k["position"])
+        datasets = sorted(list(datasets.values()), key=lambda k: k.get("position", 0))
 
         return {"labels": labels, "datasets": datasets}
 
+    def get_history_indices(self, date_from=None, date_to=None, step=None):
+        """Get the indices of the matches after which the history has a ranking.
+
+        See 'get_ranking_history' for the parameters.
+        """
+
+        dates = self.all_matches.dates
+
+        in_window = ones(len(dates), bool)
+        if date_from is not None:
+            in_window &= dates >= datetime64(date_from, "D")
+        if date_to is not None:
+            in_window &= dates <= datetime64(date_to, "D")
+
+        indices = flatnonzero(in_window)
+        if not len(indices) or not step:
+            return indices.tolist()
+
+        if step in HISTORY_STEPS:
+
+            if step == HISTORY_STEP_DAY:
+                periods = dates[indices]
+            else:
+                # NumPy weeks start on Thursday; shift the dates to start on Monday
+                periods = (dates[indices] + 3).astype("datetime64[W]")
+
+            # The last match of every period
+            return indices[append(periods[1:] != periods[:-1], True)].tolist()
+
+        selected = indices[step - 1 :: step].tolist()
+        if not selected or selected[-1] != indices[-1]:
+            selected.append(int(indices[-1]))
+
+        return selected
+
+    def get_rankings_per_match(self, indices):
+        """Yield the ranking after each of the matches with the given indices.
+
+        By default the ranking is recomputed from scratch for every requested
+        prefix of the matches. Ranking systems that can apply matches one at a time
+        should override this method.
+
+        Parameters
+        ----------
+        indices : List[int]
+            Sorted indices of the matches after which to yield the ranking.
+
+        """
+
+        for index in indices:
+            yield self.get_ranking(self.all_matches[: index + 1])
+
 
 class RankingSystemFactory:
     """Ranking system factory."""
@@ -1,16 +1,58 @@
-from numpy import absolute, argmax, linalg, sign, sqrt, zeros
-
+from os import environ
+
+from numpy import (
+    absolute,
+    add,
+    arange,
+    argmax,
+    argsort,
+    bincount,
+    concatenate,
+    errstate,
+    full,
+    ix_,
+    linalg,
+    maximum,
+    minimum,
+    nonzero,
+    ones,
+    searchsorted,
+    sign,
+    sqrt,
+    unique,
+    where,
+    zeros,
+)
+
+from myleagues_api.models.ranking_systems.match_batch import MatchBatch
 from myleagues_api.models.ranking_systems.ranking import BaseRankingSystem
+from myleagues_api.models.ranking_systems.sparse_matrix import SparseMatrix
 
 NOT_PLAYED_PLACEHOLDER = -1
 NOT_PLAYED_SCORE = 0
 
+# Power iteration is used to compute the ranking history
+POWER_ITERATION_TOLERANCE = float(environ.get("PERRON_FROBENIUS_TOLERANCE", 1e-9))
+POWER_ITERATION_MAX_ITERATIONS = 10000
+
+# Below this number of players the eigenvector of a group is computed with 'eig'
+POWER_ITERATION_MIN_PLAYERS = 50
+
+# Share of the largest entry of the initial guess added to every entry
+POWER_ITERATION_START_FLOOR = 1e-3
+
+# Above this number of players matrix A is stored sparse
+SPARSE_PLAYER_THRESHOLD = 200
+
 
 class PerronFrobeniusRankingSystem(BaseRankingSystem):
     """Perron Frobenius Ranking system class."""
 
-    def __init__(self, league):
-        super().__init__(league)
+    def __init__(self, league, match_batch=None, tolerance=POWER_ITERATION_TOLERANCE):
+
+        super().__init__(league, match_batch=match_batch)
+
+        self.tolerance = tolerance
 
     def get_ranking(self, matches: list = []):
         """Get ranking."""
@@ -25,19 +67,82 @@ class PerronFrobeniusRankingSystem(BaseRankingSystem):
 
         return self.get_ranking_list_from_dict(ranking_dict)
 
-    @classmethod
-    def add_primary_points_to_ranking_dict(cls, ranking_dict, matches):
+    def get_rankings_per_match(self, indices):
+        """Yield the ranking after each of the matches with the given indices.
+
+        Matrix A is updated in place as each match arrives (only the two cells of
+        the players involved change). The leading eigenvector is only computed for
+        the requested rankings, by power iteration warm-started from the
+        eigenvector of the previous one (see 'get_lead_ev_by_groups').
+        """
+
+        ranking_dict = self.get_initial_ranking_dict()
+
+        player_ids = list(ranking_dict.keys())
+        player_indices = {player_id: idx for idx, player_id in enumerate(player_ids)}
+
+        h2h_points = full([len(player_ids), len(player_ids)], NOT_PLAYED_PLACEHOLDER)
+        matrix_a = zeros([len(player_ids), len(player_ids)])
+        lead_ev = ones(len(player_ids)) / sqrt(len(player_ids))
+        next_index = 0
+
+        for index in indices:
+
+            matches = self.all_matches[next_index : index + 1]
+            next_index = index + 1
+
+            for match in matches:
+
+                home_idx = player_indices[match.home_player_id]
+                away_idx = player_indices[match.away_player_id]
+
+                h2h_points[home_idx, away_idx] += match.home_score
+                h2h_points[away_idx, home_idx] += match.away_score
+
+                for idx1, idx2 in [(home_idx, away_idx), (away_idx, home_idx)]:
+                    s_i_j = h2h_points[idx1, idx2]
+                    s_j_i = h2h_points[idx2, idx1]
+
+                    if s_i_j == NOT_PLAYED_PLACEHOLDER:
+                        matrix_a[idx1, idx2] = NOT_PLAYED_SCORE
+                    else:
+                        matrix_a[idx1, idx2] = self.a_i_j(s_i_j, s_j_i)
+
+            try:
+                lead_ev = self.get_lead_ev_by_groups(matrix_a, lead_ev, self.tolerance)
+            except linalg.LinAlgError:
+                lead_ev = self.get_lead_ev(matrix_a)
+
+            # The primary points are recomputed, the secondary points accumulate
+            for player_id in player_ids:
+                ranking_dict[player_id]["pts_primary"] = 0
+
+            self.add_points_to_ranking_dict(ranking_dict, player_ids, lead_ev)
+            self.add_secondary_points_to_ranking_dict(ranking_dict, matches)
+
+            yield self.get_ranking_list_from_dict(ranking_dict)
+
+    def add_primary_points_to_ranking_dict(self, ranking_dict, matches):
         """Add primary points to ranking dictionary."""
 
         # Initialize the head-to-head points dict
         player_ids = list(ranking_dict.keys())
 
-        h2h_points = cls.get_h2h_points(player_ids, matches)
-        h2h_scores = cls.get_h2h_scores(player_ids, h2h_points)
-        matrix_a = cls.get_matrix_a(player_ids, h2h_scores)
-        lead_ev = cls.get_lead_ev(matrix_a)
-
-        cls.add_points_to_ranking_dict(ranking_dict, player_ids, lead_ev)
+        # In large leagues most pairs have never met, so matrix A is mostly empty
+        if len(player_ids) > SPARSE_PLAYER_THRESHOLD:
+            matrix_a = self.get_sparse_matrix_a_from_matches(player_ids, matches)
+            try:
+                lead_ev = self.get_lead_ev_by_groups(
+                    matrix_a, ones(len(player_ids)), self.tolerance
+                )
+            except linalg.LinAlgError:
+                # The eigenvector is not unique, so take the one 'get_lead_ev' picks
+                lead_ev = self.get_lead_ev(matrix_a.toarray())
+        else:
+            matrix_a = self.get_matrix_a_from_matches(player_ids, matches)
+            lead_ev = self.get_lead_ev(matrix_a)
+
+        self.add_points_to_ranking_dict(ranking_dict, player_ids, lead_ev)
 
     @staticmethod
     def add_secondary_points_to_ranking_dict(ranking_dict, matches):
@@ -99,6 +204,77 @@ class PerronFrobeniusRankingSystem(BaseRankingSystem):
 
         return matrix_a
 
+    @classmethod
+    def get_matrix_a_from_matches(cls, player_ids, matches):
+        """Get matrix A directly from the matches.
+
+        Vectorized equivalent of 'get_h2h_points', 'get_h2h_scores' and
+        'get_matrix_a': the player ids are mapped to indices once, the scores are
+        accumulated with 'numpy.add.at' and 'a_i_j' is applied to the complete
+        head-to-head points matrix at once.
+        """
+
+        home_idx, away_idx, home_scores, away_scores = cls.get_match_arrays(
+            player_ids, matches
+        )
+
+        h2h_points = full([len(player_ids), len(player_ids)], NOT_PLAYED_PLACEHOLDER)
+        add.at(h2h_points, (home_idx, away_idx), home_scores)
+        add.at(h2h_points, (away_idx, home_idx), away_scores)
+
+        # Pairs that have not played divide by zero; these are masked out below
+        with errstate(divide="ignore", invalid="ignore"):
+            h2h_scores = cls.a_i_j(h2h_points, h2h_points.T)
+
+        return where(h2h_points == NOT_PLAYED_PLACEHOLDER, NOT_PLAYED_SCORE, h2h_scores)
+
+    @classmethod
+    def get_sparse_matrix_a_from_matches(cls, player_ids, matches):
+        """Get matrix A from the matches, storing only the pairs that have played.
+
+        Returns the same matrix as 'get_matrix_a_from_matches', but as a
+        'SparseMatrix' that takes O(nnz) instead of O(P^2) memory.
+        """
+
+        home_idx, away_idx, home_scores, away_scores = cls.get_match_arrays(
+            player_ids, matches
+        )
+
+        # Every match contributes to the cells (home, away) and (away, home)
+        size = len(player_ids)
+        rows = concatenate([home_idx, away_idx])
+        cols = concatenate([away_idx, home_idx])
+        scores = concatenate([home_scores, away_scores])
+
+        pairs, pair_indices = unique(rows * size + cols, return_inverse=True)
+        h2h_points = bincount(pair_indices, weights=scores) + NOT_PLAYED_PLACEHOLDER
+
+        # Both (i, j) and (j, i) are present for every pair that has played
+        reverse_pairs = searchsorted(pairs, (pairs % size) * size + pairs // size)
+
+        with errstate(divide="ignore", invalid="ignore"):
+            h2h_scores = cls.a_i_j(h2h_points, h2h_points[reverse_pairs])
+
+        played = h2h_points != NOT_PLAYED_PLACEHOLDER
+
+        return SparseMatrix(
+            pairs[played] // size, pairs[played] % size, h2h_scores[played], size
+        )
+
+    @staticmethod
+    def get_match_arrays(player_ids, matches):
+        """Get the player indices and scores of the matches as arrays."""
+
+        if not isinstance(matches, MatchBatch) or matches.player_ids != player_ids:
+            matches = MatchBatch.from_matches(player_ids, matches)
+
+        return (
+            matches.home_player_idx,
+            matches.away_player_idx,
+            matches.home_scores,
+            matches.away_scores,
+        )
+
     @staticmethod
     def get_lead_ev(matrix_a):
         """Get the leading eigenvector."""
@@ -111,6 +287,254 @@ class PerronFrobeniusRankingSystem(BaseRankingSystem):
         # Get the absolute eigenvector
         return absolute(eigenvectors[:, index])
 
+    @classmethod
+    def get_lead_ev_by_groups(cls, matrix_a, initial_ev, tolerance):
+        """Get the leading eigenvector by power iteration over the groups of players.
+
+        The players for which the eigenvector follows without iterating are taken
+        out first:
+
+        - A player with an empty row, e.g. one without matches, gets 0, because
+          Av = lv with an empty row i gives l * v_i = 0.
+        - A player with an empty column has no influence on the others, so their
+          entry is computed from the others afterwards, as (Av)_i / l.
+
+        The other players split into groups that never met. A is block diagonal in
+        the groups, so the eigenvector is the one of the group with the largest
+        eigenvalue, and 0 for the other groups. It is found by power iteration, or
+        for groups of less than POWER_ITERATION_MIN_PLAYERS players, where that
+        is cheaper, by 'get_simple_lead_ev'. Groups are skipped if their largest
+        row sum, an upper bound of their eigenvalue, is below the largest eigenvalue
+        so far.
+
+        Parameters
+        ----------
+        matrix_a : Union[numpy.ndarray, SparseMatrix]
+            Matrix A.
+        initial_ev : numpy.ndarray
+            Non-negative initial guess for the leading eigenvector, e.g. the one of
+            a previous step.
+        tolerance : float
+            Convergence tolerance of 'get_lead_ev_power_iteration'.
+
+        Returns
+        -------
+        numpy.ndarray
+            The leading eigenvector, normalized to unit length.
+
+        Raises
+        ------
+        numpy.linalg.LinAlgError
+            If the eigenvector can't be found this way: the largest eigenvalue is
+            not simple, no group is left or the iteration does not converge.
+
+        """
+
+        if isinstance(matrix_a, SparseMatrix):
+            rows, cols, values = matrix_a.rows, matrix_a.cols, matrix_a.values
+        else:
+            rows, cols = nonzero(matrix_a)
+            values = matrix_a[rows, cols]
+
+        size = len(initial_ev)
+
+        remaining = ones(size, bool)
+        cls.remove_empty_rows(rows, cols, remaining)
+        removed_columns = cls.remove_empty_rows(cols, rows, remaining)
+
+        if not remaining.any():
+            raise linalg.LinAlgError("No group of players is left.")
+
+        in_groups = remaining[rows] & remaining[cols]
+        rows, cols, values = rows[in_groups], cols[in_groups], values[in_groups]
+        groups = cls.get_groups(rows, cols, size)
+
+        bounds = zeros(size)
+        maximum.at(bounds, groups, bincount(rows, weights=values, minlength=size))
+
+        group_ids = unique(groups[remaining])
+        group_ids = group_ids[argsort(-bounds[group_ids], kind="stable")]
+
+        lead_ev = zeros(size)
+        lead_eigenvalue = None
+        for group_id in group_ids:
+
+            if lead_eigenvalue is not None:
+                if bounds[group_id] < lead_eigenvalue - tolerance:
+                    break
+
+            in_group = groups == group_id
+            group_matrix_a = cls.get_submatrix(matrix_a, in_group)
+
+            if in_group.sum() < POWER_ITERATION_MIN_PLAYERS:
+                if isinstance(group_matrix_a, SparseMatrix):
+                    group_matrix_a = group_matrix_a.toarray()
+                group_ev, eigenvalue = cls.get_simple_lead_ev(group_matrix_a, tolerance)
+            else:
+                # Every player starts above 0 (see 'get_lead_ev_power_iteration')
+                group_ev = initial_ev[in_group]
+                group_ev = group_ev + group_ev.max() * POWER_ITERATION_START_FLOOR
+                if not group_ev.any():
+                    group_ev = ones(len(group_ev))
+
+                group_ev = cls.get_lead_ev_power_iteration(
+                    group_matrix_a, group_ev, tolerance
+                )
+                eigenvalue = group_ev.dot(group_matrix_a.dot(group_ev))
+
+            if lead_eigenvalue is not None:
+                if abs(eigenvalue - lead_eigenvalue) <= tolerance:
+                    raise linalg.LinAlgError("Groups have the same eigenvalue.")
+                if eigenvalue < lead_eigenvalue:
+                    continue
+
+            lead_ev = zeros(size)
+            lead_ev[in_group] = group_ev
+            lead_eigenvalue = eigenvalue
+
+        # The players removed last only depend on the groups
+        for removed in reversed(removed_columns):
+            lead_ev[removed] = matrix_a.dot(lead_ev)[removed] / lead_eigenvalue
+
+        return lead_ev / linalg.norm(lead_ev)
+
+    @staticmethod
+    def get_simple_lead_ev(matrix_a, tolerance):
+        """Get the leading eigenvector and eigenvalue, like 'get_lead_ev'.
+
+        Raises a numpy.linalg.LinAlgError if the largest eigenvalue is not simple,
+        i.e. another eigenvalue is within the tolerance of it, because then the
+        eigenvector is not unique.
+        """
+
+        eigenvalues, eigenvectors = linalg.eig(matrix_a)
+        index: int = argmax(eigenvalues)
+
+        if (absolute(eigenvalues - eigenvalues[index]) <= tolerance).sum() > 1:
+            raise linalg.LinAlgError("The largest eigenvalue is not simple.")
+
+        lead_ev = absolute(eigenvectors[:, index])
+
+        return lead_ev / linalg.norm(lead_ev), eigenvalues[index].real
+
+    @staticmethod
+    def remove_empty_rows(rows, cols, remaining):
+        """Remove the players with an empty row in matrix A, until there are none.
+
+        Only the cells of the remaining players count, so removing a player can
+        empty the row of another. Pass the columns as 'rows' and vice versa to
+        remove the players with an empty column instead.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Rows of the non-zero cells of A.
+        cols : numpy.ndarray
+            Columns of the non-zero cells of A.
+        remaining : numpy.ndarray
+            Mask of the remaining players, updated in place.
+
+        Returns
+        -------
+        List[numpy.ndarray]
+            Masks of the players removed in every round.
+
+        """
+
+        removed_per_round = []
+        while True:
+            in_remaining = remaining[rows] & remaining[cols]
+            cells_per_row = bincount(rows[in_remaining], minlength=len(remaining))
+
+            removed = remaining & (cells_per_row == 0)
+            if not removed.any():
+                return removed_per_round
+
+            remaining &= ~removed
+            removed_per_round.append(removed)
+
+    @staticmethod
+    def get_groups(rows, cols, size):
+        """Get the group of every player, given the non-zero cells of matrix A.
+
+        Players are in the same group if they are connected through the cells, in
+        either direction. The group of a player is the lowest index in it.
+        """
+
+        groups = arange(size)
+        while True:
+            next_groups = groups.copy()
+            minimum.at(next_groups, rows, groups[cols])
+            minimum.at(next_groups, cols, groups[rows])
+            next_groups = next_groups[next_groups]
+
+            if (next_groups == groups).all():
+                return groups
+
+            groups = next_groups
+
+    @staticmethod
+    def get_submatrix(matrix_a, mask):
+        """Get the rows and columns of matrix A of the players in a mask."""
+
+        if isinstance(matrix_a, SparseMatrix):
+            return matrix_a.submatrix(mask)
+
+        return matrix_a[ix_(mask, mask)]
+
+    @staticmethod
+    def get_lead_ev_power_iteration(
+        matrix_a, initial_ev, tolerance=POWER_ITERATION_TOLERANCE
+    ):
+        """Get the leading eigenvector by power iteration.
+
+        The iteration runs on A + I, which has the same eigenvectors as A but a
+        strictly dominant leading eigenvalue, so it also converges when A is
+        periodic (e.g. a league of two players). It stops when the residual
+        |Av - lv| of the eigenvector v and its eigenvalue l is below the tolerance.
+
+        The result is the eigenvector of 'get_lead_ev' when the largest eigenvalue
+        of A is simple and the initial guess is positive, e.g. when every player is
+        connected to every other player and the initial guess is non-negative.
+
+        Parameters
+        ----------
+        matrix_a : Union[numpy.ndarray, SparseMatrix]
+            Matrix A.
+        initial_ev : numpy.ndarray
+            Initial guess for the leading eigenvector, e.g. the one of a previous
+            step.
+        tolerance : float
+            Convergence tolerance on the residual of the (normalized) eigenvector.
+
+        Returns
+        -------
+        numpy.ndarray
+            The leading eigenvector, normalized to unit length.
+
+        Raises
+        ------
+        numpy.linalg.LinAlgError
+            If the iteration does not converge within
+            POWER_ITERATION_MAX_ITERATIONS iterations.
+
+        """
+
+        lead_ev = initial_ev / sqrt(initial_ev.dot(initial_ev))
+
+        for _ in range(POWER_ITERATION_MAX_ITERATIONS):
+            product = matrix_a.dot(lead_ev)
+            eigenvalue = lead_ev.dot(product)
+
+            residual = product - eigenvalue * lead_ev
+            if sqrt(residual.dot(residual)) < tolerance:
+                return absolute(lead_ev)
+
+            lead_ev = product + lead_ev
+            lead_ev = lead_ev / sqrt(lead_ev.dot(lead_ev))
+
+        raise linalg.LinAlgError("Power iteration did not converge.")
+
     @staticmethod
     def add_points_to_ranking_dict(ranking_dict, player_ids, lead_ev):
         """Add points to the ranking dictionary."""
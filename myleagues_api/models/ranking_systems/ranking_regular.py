@@ -1,25 +1,142 @@
+from numpy import bincount, where
+from sqlalchemy import and_, case, func, select, union_all
+
+from myleagues_api.db import db
+from myleagues_api.models.match import Match
+from myleagues_api.models.ranking_systems.match_batch import MatchBatch
 from myleagues_api.models.ranking_systems.ranking import BaseRankingSystem
 
+# Dialects that compute the ranking in the database
+SQL_AGGREGATION_DIALECTS = ["postgresql"]
+
 
 class RegularRankingSystem(BaseRankingSystem):
     """Regular ranking system class."""
 
-    def __init__(self, league):
-        super().__init__(league)
+    def __init__(self, league, match_batch=None):
+        super().__init__(league, match_batch=match_batch)
 
     def get_ranking(self, matches=[]):
         """Get ranking."""
 
         if not matches:
+
+            # Let the database add up the points when it can, unless the matches
+            # have been loaded already
+            if (
+                self._match_batch is None
+                and db.session.get_bind().dialect.name in SQL_AGGREGATION_DIALECTS
+            ):
+                return self.get_ranking_from_database()
+
             matches = self.all_matches
 
+        if not isinstance(matches, MatchBatch):
+            matches = MatchBatch.from_matches(self.player_ids, matches)
+
         ranking_dict = self.get_initial_ranking_dict()
 
-        for match in matches:
-            self.add_points_to_ranking_dict(match, ranking_dict)
+        self.add_points_to_ranking_dict_from_batch(matches, ranking_dict)
 
         return self.get_ranking_list_from_dict(ranking_dict)
 
+    @staticmethod
+    def add_points_to_ranking_dict_from_batch(match_batch, ranking_dict):
+        """Add the points of all matches in a match batch to the ranking dictionary."""
+
+        home_scores, away_scores = match_batch.home_scores, match_batch.away_scores
+        size = len(match_batch.player_ids)
+
+        # 2 points for a win, 1 for a draw, 0 for a loss
+        home_pts_pri = where(home_scores > away_scores, 2, 0)
+        home_pts_pri = where(home_scores == away_scores, 1, home_pts_pri)
+        away_pts_pri = 2 - home_pts_pri
+
+        score_difference = home_scores - away_scores
+
+        home_idx, away_idx = match_batch.home_player_idx, match_batch.away_player_idx
+        pts_primary = bincount(home_idx, home_pts_pri, size) + bincount(
+            away_idx, away_pts_pri, size
+        )
+        pts_secondary = bincount(home_idx, score_difference, size) - bincount(
+            away_idx, score_difference, size
+        )
+
+        for idx, player_id in enumerate(match_batch.player_ids):
+            ranking_dict[player_id]["pts_primary"] += int(pts_primary[idx])
+            ranking_dict[player_id]["pts_secondary"] += int(pts_secondary[idx])
+
+    def get_ranking_from_database(self):
+        """Get ranking, aggregated over all matches in one query.
+
+        Every match is counted once from the perspective of the home player and
+        once from the perspective of the away player; the points are then summed
+        per player. Only one row per player is returned by the database.
+        """
+
+        matches = Match.__table__
+        is_league_match = and_(matches.c.league_id == self.league.id, Match.is_live())
+
+        home = select(
+            [
+                matches.c.home_player_id.label("player_id"),
+                matches.c.home_score.label("score_for"),
+                matches.c.away_score.label("score_against"),
+            ]
+        ).where(is_league_match)
+        away = select(
+            [
+                matches.c.away_player_id.label("player_id"),
+                matches.c.away_score.label("score_for"),
+                matches.c.home_score.label("score_against"),
+            ]
+        ).where(is_league_match)
+        sides = union_all(home, away).alias("sides")
+
+        query = select(
+            [
+                sides.c.player_id,
+                func.sum(
+                    case(
+                        [
+                            (sides.c.score_for > sides.c.score_against, 2),
+                            (sides.c.score_for == sides.c.score_against, 1),
+                        ],
+                        else_=0,
+                    )
+                ).label("pts_primary"),
+                func.sum(sides.c.score_for - sides.c.score_against).label(
+                    "pts_secondary"
+                ),
+            ]
+        ).group_by(sides.c.player_id)
+
+        ranking_dict = self.get_initial_ranking_dict()
+
+        for row in db.session.execute(query):
+            ranking_dict[row.player_id]["pts_primary"] += int(row.pts_primary)
+            ranking_dict[row.player_id]["pts_secondary"] += int(row.pts_secondary)
+
+        return self.get_ranking_list_from_dict(ranking_dict)
+
+    def get_rankings_per_match(self, indices):
+        """Yield the ranking after each of the matches with the given indices.
+
+        Every match is applied once to a running ranking dictionary, so the full
+        history costs O(n) in the number of matches.
+        """
+
+        ranking_dict = self.get_initial_ranking_dict()
+        next_index = 0
+
+        for index in indices:
+
+            for match in self.all_matches[next_index : index + 1]:
+                self.add_points_to_ranking_dict(match, ranking_dict)
+            next_index = index + 1
+
+            yield self.get_ranking_list_from_dict(ranking_dict)
+
     def add_points_to_ranking_dict(self, match, ranking_dict):
         """Add points to the ranking dictionary."""
 
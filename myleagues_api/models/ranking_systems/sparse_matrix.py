@@ -0,0 +1,44 @@
+from numpy import bincount, cumsum, zeros
+
+
+class SparseMatrix:
+    """Square matrix that only stores its non-zero cells (coordinate format)."""
+
+    def __init__(self, rows, cols, values, size):
+
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.size = size
+
+    @property
+    def nnz(self):
+        """Return the number of stored cells."""
+        return len(self.values)
+
+    def dot(self, vector):
+        """Multiply the matrix with a vector in O(nnz)."""
+        return bincount(
+            self.rows, weights=self.values * vector[self.cols], minlength=self.size
+        )
+
+    def submatrix(self, mask):
+        """Return the rows and columns in a boolean mask as a new sparse matrix."""
+
+        keep = mask[self.rows] & mask[self.cols]
+        new_indices = cumsum(mask) - 1
+
+        return SparseMatrix(
+            new_indices[self.rows[keep]],
+            new_indices[self.cols[keep]],
+            self.values[keep],
+            int(mask.sum()),
+        )
+
+    def toarray(self):
+        """Return the matrix as a dense array."""
+
+        matrix = zeros([self.size, self.size])
+        matrix[self.rows, self.cols] = self.values
+
+        return matrix
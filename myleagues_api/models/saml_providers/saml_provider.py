@@ -1,11 +1,16 @@
 import json
 import os
+import re
 import time
 from abc import ABC, abstractmethod
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
 
+import requests
 from cryptography.fernet import Fernet
 from flask import abort
 from oauthlib.oauth2 import WebApplicationClient
+from requests.adapters import HTTPAdapter
 
 ENCODING = "utf-8"
 
@@ -13,14 +18,123 @@ state_validity_seconds = 300
 
 f = Fernet(os.environ["FERNET_KEY"].encode(ENCODING))
 
+# Timeouts (connect, read) in seconds of all requests to the providers
+HTTP_TIMEOUT = (3.05, 10)
+HTTP_POOL_MAXSIZE = 10
+
+# Provider configurations are cached this long if the response doesn't say
+PROVIDER_CFG_DEFAULT_TTL = 3600
+
+_http_session = None
+
+
+class TimeoutSession(requests.Session):
+    """HTTP session that applies a default timeout to all requests.
+
+    The session is shared by the requests of all users, so it doesn't keep cookies:
+    a cookie set in response to one user's request would be sent with the next.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        super().__init__()
+
+        self.timeout = timeout
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):
+        """Send a request, with the default timeout unless one is given."""
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        return super().request(method, url, **kwargs)
+
+
+def get_http_session():
+    """Get the HTTP session shared by the providers, creating it on first use.
+
+    The session keeps connections to the providers alive between requests.
+    """
+
+    global _http_session
+
+    if _http_session is None:
+        _http_session = TimeoutSession()
+        adapter = HTTPAdapter(pool_maxsize=HTTP_POOL_MAXSIZE)
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+
+    return _http_session
+
+
+class ProviderCfgCache:
+    """Cache of provider configurations (OIDC discovery documents) by URL.
+
+    A configuration is cached for the 'max-age' in the Cache-Control header of its
+    response, or for 'PROVIDER_CFG_DEFAULT_TTL' seconds without one, minus the
+    time it already spent in caches on the way (the Age header). Responses with
+    'no-store' or 'no-cache' are not cached.
+    """
+
+    def __init__(self):
+
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, url, session):
+        """Get the provider configuration at a URL, fetching it if needed."""
+
+        with self._lock:
+            entry = self._entries.get(url)
+
+        if entry is not None and entry["expires_at"] > time.time():
+            return entry["cfg"]
+
+        response = session.get(url)
+        response.raise_for_status()
+        cfg = response.json()
+
+        ttl = self.get_ttl(response.headers)
+        if ttl > 0:
+            with self._lock:
+                self._entries[url] = {"cfg": cfg, "expires_at": time.time() + ttl}
+
+        return cfg
+
+    def clear(self):
+        """Remove all cached configurations."""
+
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def get_ttl(headers):
+        """Get the number of seconds a response may still be cached from its headers."""
+
+        directives = headers.get("Cache-Control", "").lower()
+        if "no-store" in directives or "no-cache" in directives:
+            return 0
+
+        max_age = re.search(r"max-age=(\d+)", directives)
+        lifetime = int(max_age.group(1)) if max_age else PROVIDER_CFG_DEFAULT_TTL
+
+        age = headers.get("Age", "").strip()
+        if age.isdigit():
+            lifetime -= int(age)
+
+        return max(lifetime, 0)
+
+
+provider_cfg_cache = ProviderCfgCache()
+
 
 class BaseSamlProvider(ABC):
     """Base class for the saml providers."""
 
-    def __init__(self, provider_name, client_id):
+    def __init__(self, provider_name, client_id, http_session=None):
 
         self.provider_name = provider_name
         self.oauth_client = WebApplicationClient(client_id)
+        self.http_session = http_session or get_http_session()
 
     @staticmethod
     def get_redirect_uri():
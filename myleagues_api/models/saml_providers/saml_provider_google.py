@@ -2,29 +2,35 @@ import json
 import os
 import uuid
 
-import requests
 from werkzeug.exceptions import HTTPException
 
 from myleagues_api.models.access_token import AccessToken
-from myleagues_api.models.saml_providers.saml_provider import BaseSamlProvider
+from myleagues_api.models.saml_providers.saml_provider import (
+    BaseSamlProvider,
+    provider_cfg_cache,
+)
 from myleagues_api.models.user import User
 
 GOOGLE_PROVIDER_NAME = "google"
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", None)
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET", None)
-GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_DISCOVERY_URL = os.environ.get(
+    "GOOGLE_DISCOVERY_URL",
+    "https://accounts.google.com/.well-known/openid-configuration",
+)
 
 
 class SamlProviderGoogle(BaseSamlProvider):
     """Class for the Google SAML provider."""
 
-    def __init__(self):
-        super().__init__(GOOGLE_PROVIDER_NAME, GOOGLE_CLIENT_ID)
+    def __init__(self, discovery_url=GOOGLE_DISCOVERY_URL, http_session=None):
+        super().__init__(GOOGLE_PROVIDER_NAME, GOOGLE_CLIENT_ID, http_session)
 
-    @staticmethod
-    def get_provider_cfg():
-        """Get the provider config."""
-        return requests.get(GOOGLE_DISCOVERY_URL).json()
+        self.discovery_url = discovery_url
+
+    def get_provider_cfg(self):
+        """Get the provider config, from the cache if it is still fresh."""
+        return provider_cfg_cache.get(self.discovery_url, self.http_session)
 
     def get_request_uri(self):
         """Get the request URI."""
@@ -59,7 +65,7 @@ class SamlProviderGoogle(BaseSamlProvider):
             code=code,
         )
 
-        token_response = requests.post(
+        token_response = self.http_session.post(
             token_url,
             headers=headers,
             data=body,
@@ -74,7 +80,7 @@ class SamlProviderGoogle(BaseSamlProvider):
         # including their Google profile picture and email
         userinfo_endpoint = provider_cfg["userinfo_endpoint"]
         uri, headers, body = self.oauth_client.add_token(userinfo_endpoint)
-        userinfo_response = requests.get(uri, headers=headers, data=body)
+        userinfo_response = self.http_session.get(uri, headers=headers, data=body)
 
         user_data = userinfo_response.json()
 
@@ -89,18 +95,9 @@ class SamlProviderGoogle(BaseSamlProvider):
 
         except HTTPException:
 
-            # Generate unique username
-            username_base = user_data["email"].split("@")[0]
-            username_candidate = username_base
-            suffix = 1
-
-            while User().username_exists(username_candidate):
-                username_candidate = username_base + str(suffix)
-                suffix = suffix + 1
-
-            # Create the user
-            user = User.create(
-                username=username_candidate,
+            # Create the user, with a unique username based on the email address
+            user = User.create_with_free_username(
+                username_base=user_data["email"].split("@")[0],
                 password=uuid.uuid4().hex,
                 picture=user_data["picture"],
                 locale=user_data["locale"],
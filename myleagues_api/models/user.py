@@ -1,4 +1,7 @@
+import re
 import uuid
+from os import environ
+from threading import BoundedSemaphore
 
 from flask import abort
 from sqlalchemy import exc
@@ -9,9 +12,63 @@ from werkzeug.security import check_password_hash, generate_password_hash
 
 from myleagues_api.db import db
 from myleagues_api.models.league import League
+from myleagues_api.models.ranking_snapshot import RankingSnapshot
 from myleagues_api.tables.participations import participations
 
-HASH_METHOD = "pbkdf2:sha256:15000"
+HASH_METHOD = environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:15000")
+
+# Passwords are hashed on the request thread. At most 'HASH_MAX_CONCURRENT' hashes
+# run at once; requests that can't get a slot within 'HASH_QUEUE_TIMEOUT' seconds
+# are refused, rather than piling up.
+HASH_MAX_CONCURRENT = int(environ.get("PASSWORD_HASH_MAX_CONCURRENT", 8))
+HASH_QUEUE_TIMEOUT = 5
+
+_hash_prefix = None
+_hash_slots = BoundedSemaphore(HASH_MAX_CONCURRENT)
+
+
+def run_hash_function(function, *args):
+    """Run a password hashing function once a hash slot is free."""
+
+    if not _hash_slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        abort(503, "Too many logins at the moment, please try again later.")
+
+    try:
+        return function(*args)
+    finally:
+        _hash_slots.release()
+
+
+def get_hash_prefix():
+    """Get the prefix that hashes made with the current hash parameters start with.
+
+    Werkzeug fills in defaults, e.g. 'pbkdf2:sha256' is stored as
+    'pbkdf2:sha256:260000', so the prefix is taken from an actual hash.
+    """
+
+    global _hash_prefix
+
+    if _hash_prefix is None:
+        _hash_prefix = generate_password_hash("", HASH_METHOD).split("$", 1)[0]
+
+    return _hash_prefix
+
+
+def hash_password(password):
+    """Hash a password with the current hash parameters."""
+
+    return run_hash_function(generate_password_hash, password, HASH_METHOD)
+
+
+def check_password(password_hashed, password):
+    """Check a password against a hash."""
+
+    return run_hash_function(check_password_hash, password_hashed, password)
+
+
+# Creating a user with a generated username gives up after this many usernames
+# in a row were taken by concurrent sign-ups
+USERNAME_MAX_ATTEMPTS = 5
 
 
 class User(db.Model):
@@ -45,7 +102,7 @@ class User(db.Model):
 
         user_dict = {
             "username": username,
-            "password_hashed": generate_password_hash(password, HASH_METHOD),
+            "password_hashed": hash_password(password),
             "picture": picture,
             "locale": locale,
             "google_sub": google_sub,
@@ -66,6 +123,59 @@ class User(db.Model):
             db.session.rollback()
             abort(409, "Username already taken.")
 
+    @classmethod
+    def create_with_free_username(cls, username_base, password, **kwargs):
+        """Create a user with the first free username based on 'username_base'.
+
+        If a concurrent sign-up takes the username first, the unique constraint
+        detects it and the next free username is tried, a limited number of times.
+        """
+
+        for _ in range(USERNAME_MAX_ATTEMPTS):
+
+            try:
+                return cls.create(
+                    username=cls.get_free_username(username_base),
+                    password=password,
+                    **kwargs,
+                )
+            except HTTPException as e:
+                if e.code != 409:
+                    raise e
+
+        abort(503, "No username available. Please try again.")
+
+    @classmethod
+    def get_free_username(cls, username_base: str) -> str:
+        """Get the username base, or the base with the lowest free number suffix.
+
+        The taken usernames are read in a single query. On Postgres that only reads
+        the base and the base with a number suffix, elsewhere every username that
+        starts with the base.
+        """
+
+        if db.engine.dialect.name == "postgresql":
+            condition = cls.username.op("~")(f"^{re.escape(username_base)}[0-9]*$")
+        else:
+            pattern = (
+                username_base.replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+            condition = cls.username.like(f"{pattern}%", escape="\\")
+
+        taken = {
+            username for (username,) in db.session.query(cls.username).filter(condition)
+        }
+
+        username = username_base
+        suffix = 1
+        while username in taken:
+            username = username_base + str(suffix)
+            suffix = suffix + 1
+
+        return username
+
     @classmethod
     def username_exists(cls, username: str):
         """Check whether a username exists."""
@@ -99,6 +209,11 @@ class User(db.Model):
         if not user.password_is_correct(password):
             abort(403, "Invalid password.")
 
+        # Upgrade hashes with outdated parameters while the password is known
+        if user.password_needs_rehash():
+            user.password_hashed = hash_password(password)
+            db.session.commit()
+
         return user
 
     @classmethod
@@ -109,9 +224,18 @@ class User(db.Model):
         league = League.read_one(filter={"id": league_id})
 
         user.leagues.append(league)
+
+        # The new player has to show up in the ranking
+        RankingSnapshot.invalidate(league.id)
+
         db.session.commit()
 
     def password_is_correct(self, password: str) -> bool:
         """Check whether the password is correct."""
 
-        return check_password_hash(self.password_hashed, password)
+        return check_password(self.password_hashed, password)
+
+    def password_needs_rehash(self) -> bool:
+        """Check whether the password hash uses outdated hash parameters."""
+
+        return self.password_hashed.split("$", 1)[0] != get_hash_prefix()
@@ -0,0 +1,38 @@
+"""Purge the records of expired access tokens.
+
+Run it periodically, e.g. from a cron job:
+
+    python -m myleagues_api.purge --batch-size 1000
+"""
+
+import argparse
+
+from myleagues_api.models.access_token import PURGE_BATCH_SIZE, AccessToken
+from myleagues_api.schema import create_command_app
+
+
+def main(config_file="configs/postgresql.py"):
+    """Delete the expired access tokens in the database in the given configuration."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE)
+    parser.add_argument(
+        "--max-batches",
+        type=int,
+        default=None,
+        help="Stop after this many batches, the rest is purged by the next run.",
+    )
+    args = parser.parse_args()
+
+    app = create_command_app(config_file)
+
+    with app.app_context():
+        deleted = AccessToken.purge_expired(
+            batch_size=args.batch_size, max_batches=args.max_batches
+        )
+
+    print(f"Deleted {deleted} expired access tokens.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Database schema management.
+
+Creating the schema runs DDL and many catalog queries, so it is not done on every
+start of the app. Run it once per deployment instead:
+
+    python -m myleagues_api.schema
+"""
+
+from os import environ
+
+from flask import Flask, current_app
+from sqlalchemy import event, exc, func, inspect, select
+
+from myleagues_api.db import db, init_db
+from myleagues_api.tables.schema_version import schema_version
+
+# Bump this when the tables change, so the next deployment creates them
+SCHEMA_VERSION = 2
+
+# Id of the Postgres advisory lock that serializes schema creation
+SCHEMA_LOCK_ID = 8437201
+
+
+def set_search_path(app, db, schema):
+    """Make the schema the search path of every new database connection.
+
+    A 'SET search_path' on a single connection only affects that connection, not
+    the other connections in the pool.
+    """
+
+    binds = [None] + list(app.config.get("SQLALCHEMY_BINDS") or {})
+
+    for bind in binds:
+
+        @event.listens_for(db.get_engine(app, bind=bind), "connect")
+        def connect(dbapi_connection, connection_record):
+
+            # Outside a transaction, so a rollback does not undo it
+            autocommit = dbapi_connection.autocommit
+            dbapi_connection.autocommit = True
+
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET search_path = {schema}")
+            cursor.close()
+
+            dbapi_connection.autocommit = autocommit
+
+
+def schema_is_current(db):
+    """Check with a single query whether the stored schema version is current.
+
+    A newer version counts as current too: during a rolling deployment the
+    instances of the previous release keep running on the schema of the new one.
+    """
+
+    try:
+        with db.engine.connect() as connection:
+            version = connection.execute(select([schema_version.c.version])).scalar()
+    except exc.DBAPIError:
+
+        # The schema has never been created
+        return False
+
+    return version is not None and version >= SCHEMA_VERSION
+
+
+def create_schema(db, schema, build_indexes=False):
+    """Create the schema, its tables and indexes, and store the schema version.
+
+    On Postgres, instances that start at the same time take turns through an
+    advisory lock; the ones that get it later find the schema current and skip.
+
+    Indexes that are missing on existing tables are only built with
+    'build_indexes', since that can take long on large tables. Without it the
+    schema version is not stored, so the schema stays outdated until they are.
+    """
+
+    with db.engine.connect() as lock_connection:
+
+        # The lock is held by the session; autocommit keeps it out of a transaction
+        locked = db.engine.dialect.name == "postgresql"
+        if locked:
+            lock_connection = lock_connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+            lock_connection.execute(select([func.pg_advisory_lock(SCHEMA_LOCK_ID)]))
+
+        try:
+            if not schema_is_current(db):
+                run_schema_ddl(db, schema, build_indexes)
+        finally:
+            if locked:
+                lock_connection.execute(
+                    select([func.pg_advisory_unlock(SCHEMA_LOCK_ID)])
+                )
+
+
+def run_schema_ddl(db, schema, build_indexes):
+    """Run the DDL of 'create_schema'."""
+
+    db.session.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    db.session.commit()
+
+    # The tables are only created on the primary, not on the read replica
+    db.create_all(bind=None)
+
+    missing_indexes = get_missing_indexes(db)
+    if missing_indexes and not build_indexes:
+        current_app.logger.warning(
+            f"Indexes {[index.name for index in missing_indexes]} are missing, "
+            "run 'python -m myleagues_api.schema' to build them."
+        )
+        return
+
+    create_indexes(db, missing_indexes)
+
+    # Never replace the version stored by a newer release
+    stored_version = db.session.execute(
+        select([func.max(schema_version.c.version)])
+    ).scalar()
+    if stored_version is None or stored_version < SCHEMA_VERSION:
+        db.session.execute(schema_version.delete())
+        db.session.execute(schema_version.insert().values(version=SCHEMA_VERSION))
+    db.session.commit()
+
+
+def get_missing_indexes(db):
+    """Get the indexes that are missing on existing tables.
+
+    'create_all' skips existing tables, including indexes added to them later.
+    """
+
+    inspector = inspect(db.engine)
+
+    missing_indexes = []
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing_indexes += [
+            index for index in table.indexes if index.name not in existing
+        ]
+
+    return missing_indexes
+
+
+def create_indexes(db, indexes):
+    """Create indexes on existing tables.
+
+    On Postgres they are built CONCURRENTLY, so writes to the tables can go on
+    while they are built. That cannot run inside a transaction.
+    """
+
+    if db.engine.dialect.name != "postgresql":
+        for index in indexes:
+            index.create(db.engine)
+        return
+
+    with db.engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+
+        for index in indexes:
+            index.dialect_options["postgresql"]["concurrently"] = True
+            index.create(connection)
+
+
+def create_command_app(config_file="configs/postgresql.py"):
+    """Create a minimal app with a database connection, for command line jobs."""
+
+    app = Flask("myleagues_api")
+    app.config.from_pyfile(config_file)
+    init_db(app, db)
+
+    set_search_path(app, db, environ["POSTGRES_SCHEMA"])
+
+    return app
+
+
+def main(config_file="configs/postgresql.py"):
+    """Create the schema of the database in the given configuration."""
+
+    app = create_command_app(config_file)
+
+    with app.app_context():
+        create_schema(db, environ["POSTGRES_SCHEMA"], build_indexes=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Schema version table."""
+
+from myleagues_api.db import db
+
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, primary_key=True),
+)
@@ -0,0 +1,120 @@
+"""Tests for the number of queries needed to serialize leagues."""
+
+import unittest
+import uuid
+
+from sqlalchemy import event
+
+from benchmarks.common import create_league, create_sqlite_app
+from myleagues_api.db import db
+from myleagues_api.endpoints.serialization import (
+    get_eager_relationships,
+    serialize_league,
+    serialize_leagues,
+)
+from myleagues_api.models.league import League
+from myleagues_api.models.user import User
+
+
+class TestLeagueQueries(unittest.TestCase):
+    """Test that serializing a league takes a fixed number of queries."""
+
+    def setUp(self):
+
+        self.app = create_sqlite_app()
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.statements = []
+        event.listen(db.engine, "before_cursor_execute", self.count_statement)
+
+    def tearDown(self):
+
+        event.remove(db.engine, "before_cursor_execute", self.count_statement)
+
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, *args):
+        """Count an executed statement."""
+        self.statements.append(args[2])
+
+    def count_serialization_queries(self, league_id, attributes):
+        """Count the queries to read and serialize a league, as the endpoints do."""
+
+        db.session.expunge_all()
+        self.statements.clear()
+
+        with self.app.test_request_context():
+            league = League.read_one(
+                {"id": league_id}, eager=get_eager_relationships(attributes)
+            )
+            serialize_league(league, attributes)
+
+        return len(self.statements)
+
+    def test_query_count_does_not_grow_with_league_size(self):
+        """Test that the query count is the same for small and large leagues."""
+
+        league_ids = [
+            create_league(nr_of_players, nr_of_matches)
+            for nr_of_players, nr_of_matches in [(4, 5), (20, 200), (50, 2000)]
+        ]
+
+        # All attributes, and only the matches (without the players loaded first)
+        for attributes in [None, {"id", "matches"}]:
+            with self.subTest(attributes=attributes):
+                query_counts = [
+                    self.count_serialization_queries(league_id, attributes)
+                    for league_id in league_ids
+                ]
+
+                self.assertEqual(len(set(query_counts)), 1, query_counts)
+
+    def count_user_leagues_queries(self, user_id):
+        """Count the queries to read and serialize the leagues of a user."""
+
+        db.session.expunge_all()
+        self.statements.clear()
+
+        with self.app.test_request_context():
+            leagues = League.read_many(
+                {"player_id": user_id}, eager=get_eager_relationships(None)
+            )
+            data = serialize_leagues(leagues)
+
+        self.assertTrue(all(league["attributes"]["ranking"] for league in data))
+
+        return len(self.statements)
+
+    def test_user_leagues_query_count_does_not_grow_with_leagues(self):
+        """Test that the query count is the same for users with few or many leagues.
+
+        The rankings are computed (there are no snapshots yet), so storing them
+        commits the session halfway through the serialization.
+        """
+
+        query_counts = []
+        for nr_of_leagues in [1, 5, 20]:
+            player_ids = [uuid.uuid4() for _ in range(4)]
+            db.session.bulk_insert_mappings(
+                User,
+                [
+                    {"id": player_id, "username": player_id.hex}
+                    for player_id in player_ids
+                ],
+            )
+
+            for _ in range(nr_of_leagues):
+                create_league(4, 20, player_ids=player_ids)
+
+            query_counts.append(self.count_user_leagues_queries(player_ids[0]))
+
+        self.assertEqual(len(set(query_counts)), 1, query_counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests for the bound on concurrent password hashes."""
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from unittest import mock
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import generate_password_hash
+
+# Fills in the settings the app reads from the environment at import time
+import benchmarks.common  # noqa: F401
+from myleagues_api.models import user
+
+PASSWORD = "password"
+
+
+class TestPasswordHashing(unittest.TestCase):
+    """Test that at most HASH_MAX_CONCURRENT passwords are hashed at once."""
+
+    def setUp(self):
+
+        self.password_hashed = generate_password_hash(PASSWORD, user.HASH_METHOD)
+
+        self.lock = Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def check_password_hash(self, password_hashed, password):
+        """Check a password like werkzeug, recording how many checks run at once."""
+
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        # Long enough for all logins to be waiting for a slot meanwhile
+        time.sleep(0.05)
+
+        with self.lock:
+            self.running -= 1
+
+        return password_hashed == self.password_hashed and password == PASSWORD
+
+    def test_concurrent_checks_are_bounded(self):
+        """Test that concurrent logins never run more checks at once than allowed."""
+
+        nr_of_logins = 3 * user.HASH_MAX_CONCURRENT
+
+        with mock.patch.object(
+            user, "check_password_hash", self.check_password_hash
+        ), ThreadPoolExecutor(max_workers=nr_of_logins) as logins:
+            results = list(
+                logins.map(
+                    lambda _: user.check_password(self.password_hashed, PASSWORD),
+                    range(nr_of_logins),
+                )
+            )
+
+        self.assertTrue(all(results))
+        self.assertEqual(self.max_running, user.HASH_MAX_CONCURRENT)
+
+    def test_check_without_free_slot_is_refused(self):
+        """Test that a login that gets no slot within the timeout gets a 503."""
+
+        for _ in range(user.HASH_MAX_CONCURRENT):
+            user._hash_slots.acquire()
+
+        try:
+            with mock.patch.object(user, "HASH_QUEUE_TIMEOUT", 0.1):
+                with self.assertRaises(HTTPException) as context:
+                    user.check_password(self.password_hashed, PASSWORD)
+        finally:
+            for _ in range(user.HASH_MAX_CONCURRENT):
+                user._hash_slots.release()
+
+        self.assertEqual(context.exception.code, 503)
+        self.assertTrue(user.check_password(self.password_hashed, PASSWORD))
+
+
+if __name__ == "__main__":
+    unittest.main()